@@ -6,12 +6,112 @@ import re
 import argparse
 from typing import List, Tuple, Optional
 from asciinema2md.parser import parse_cast_file
-from asciinema2md.ansi import strip_ansi, clean_text
+from asciinema2md.ansi import strip_ansi, clean_text, printable_ascii
 from asciinema2md.terminal import Terminal
 from asciinema2md.detector import split_commands_and_output
 from asciinema2md.formatter import format_as_markdown
 
 
+# Compiled once at import - these run on every command in the filter loop
+_WS_RE = re.compile(r'\s+')
+
+# Prompt patterns for the fallback extractor
+_PROMPT_START_RE = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]')
+_PROMPT_END_RE = re.compile(r'└─[#\$]\s*(.+)$')
+
+# Vim artifact filters for clean_output: cheap literal checks first, one
+# combined regex for the status-line patterns
+_VIM_STRIP_SET = frozenset(('▽', 'zz'))
+_VIM_INLINE = ('-- INSERT --', '-- REPLACE --')
+_VIM_STATUS_RE = re.compile(r'^\d+,\d+.*All')
+
+# Exact first words that are always typing artifacts
+_KNOWN_ARTIFACTS = frozenset(('asciinema2mdpt', 'asciinema2md'))
+
+# Known command names, used to spot typing artifacts like "asciinema2mdpt"
+# (a real command buried in stray characters). One compiled alternation
+# replaces a startswith/in loop over the list for every extracted command.
+_VALID_PREFIX_RE = re.compile(
+    r'(?:cd|ls|cp|mv|rm|cat|vim|nano|exit|pwd|mkdir|nmap|apt|env).{3,}$')
+_VALID_CONTAINS_RE = re.compile(
+    r'cd|ls|cp|mv|rm|cat|vim|nano|exit|pwd|mkdir|nmap|apt|env')
+
+
+def _word_has_repetition(word: str) -> bool:
+    """
+    Check a command's first word for typing-artifact repetition.
+
+    Detects the same character appearing 3+ times in a row, or (for words
+    longer than 5 chars) more than 3 times in total. Single pass with early
+    exit instead of building a count dict plus a separate regex scan.
+    """
+    check_totals = len(word) > 5
+    counts = [0] * 128
+    prev = ''
+    run = 0
+    for char in word:
+        if char == prev:
+            run += 1
+            if run >= 3:
+                return True
+        else:
+            prev = char
+            run = 1
+        if check_totals:
+            code = ord(char)
+            if code < 128:
+                counts[code] += 1
+                if counts[code] > 3:
+                    return True
+    return False
+
+
+def _coalesce_o_events(events: List[Tuple[float, str, str]],
+                       max_len: int = 4096) -> List[Tuple[float, str, str]]:
+    """
+    Merge runs of adjacent 'o' events into larger chunks.
+
+    Typed commands arrive as one tiny event per keystroke; batching them
+    amortizes the per-event regex and state-machine cost downstream. Events
+    containing a carriage return or newline (prompt headers, Enter presses)
+    are kept as their own chunks so boundary detection still fires.
+    """
+    coalesced = []
+    buf = []
+    buf_ts = 0.0
+    buf_len = 0
+
+    def flush():
+        nonlocal buf, buf_len
+        if buf:
+            coalesced.append((buf_ts, 'o', ''.join(buf)))
+            buf = []
+            buf_len = 0
+
+    for timestamp, event_type, text in events:
+        if event_type != 'o':
+            flush()
+            coalesced.append((timestamp, event_type, text))
+            continue
+
+        # Keep line-boundary events separate so Enter/prompt detection
+        # still sees them in isolation
+        if '\r' in text or '\n' in text:
+            flush()
+            coalesced.append((timestamp, event_type, text))
+            continue
+
+        if not buf:
+            buf_ts = timestamp
+        buf.append(text)
+        buf_len += len(text)
+        if buf_len >= max_len:
+            flush()
+
+    flush()
+    return coalesced
+
+
 def process_cast_file(filepath: str, strip_colors: bool = True) -> str:
     """
     Process an asciinema cast file and convert to Markdown.
@@ -26,6 +126,14 @@ def process_cast_file(filepath: str, strip_colors: bool = True) -> str:
     # Parse cast file
     metadata, events = parse_cast_file(filepath)
     
+    # Batch adjacent keystroke events so downstream loops see far fewer,
+    # larger chunks
+    events = _coalesce_o_events(events)
+    
+    # Output-event texts, prefiltered once - the post-processing scan and the
+    # terminal fallback only ever look at 'o' events and never at timestamps
+    o_texts = [text for _, event_type, text in events if event_type == 'o']
+    
     # Get terminal dimensions from metadata
     width = metadata.get('width', 80)
     height = metadata.get('height', 24)
@@ -36,15 +144,66 @@ def process_cast_file(filepath: str, strip_colors: bool = True) -> str:
     direct_extractor = DirectExtractor()
     commands_and_output = direct_extractor.process_events(events)
     
-    # Filter commands: only keep clean, final commands
-    filtered_commands = []
-    seen = set()
+    # Filter, fix up, and deduplicate in a single pass
+    commands_and_output = _postprocess(commands_and_output, o_texts)
+    
+    # Final fallback to simple terminal approach
+    if len(commands_and_output) < 2:
+        # Get terminal dimensions from metadata
+        width = metadata.get('width', 80)
+        height = metadata.get('height', 24)
+        
+        # Process all output events through terminal emulator
+        terminal = Terminal(width=width, height=height)
+        
+        for text in o_texts:
+            terminal.process_text(text)
+        
+        # Get final terminal output
+        final_output = terminal.get_output()
+        
+        # Strip ANSI codes (the emulator already leaves the buffer clean)
+        if strip_colors and not terminal.output_is_clean:
+            final_output = strip_ansi(final_output)
+        
+        # Extract commands from final output
+        fallback_commands = extract_commands_from_output(final_output)
+        
+        # Use fallback if it found commands
+        if fallback_commands:
+            commands_and_output = fallback_commands
+    
+    # Format as Markdown
+    markdown = format_as_markdown(commands_and_output, metadata)
     
+    return markdown
+
+
+
+def _postprocess(commands_and_output: List[Tuple[str, str]],
+                 o_texts: List[str]) -> List[Tuple[str, str]]:
+    """
+    Filter, fix up, and deduplicate extracted commands in a single pass.
+    
+    Args:
+        commands_and_output: Raw (command, output) tuples from the extractor
+        o_texts: Output-event texts (scanned only for the missing-nmap fixup)
+        
+    Returns:
+        Cleaned list of (command, output) tuples
+    """
+    # Keyed by command string (dicts preserve insertion order), so dropping
+    # a near-duplicate is one del instead of a list rebuild
+    filtered_commands = {}
+    seen_full = set()
+    by_prefix = {}  # first 10 chars of command -> command currently holding it
+    has_first_nmap = False
+
     for cmd, output in commands_and_output:
         # Skip commands with obvious typing artifacts
         if (len(cmd) < 3 or
             '[' in cmd and ('?1' in cmd or '?2004' in cmd) or  # ANSI escape sequences
-            cmd.count(' ') > 15 or  # Too many spaces (typing artifacts)
+            len(cmd) > 16 and cmd.count(' ') > 15 or  # Too many spaces (typing artifacts)
             not cmd[0].isalpha()):  # Doesn't start with letter
             continue
         
@@ -58,150 +217,91 @@ def process_cast_file(filepath: str, strip_colors: bool = True) -> str:
                 continue
             
             # Skip specific known typing artifacts
-            if first_word in ['asciinema2mdpt', 'asciinema2md']:
-                continue
-            
-            # Check if first word has excessive character repetition
-            char_counts = {}
-            for char in first_word:
-                char_counts[char] = char_counts.get(char, 0) + 1
-            if any(count > 3 for count in char_counts.values()) and len(first_word) > 5:
-                # Likely typing artifact
+            if first_word in _KNOWN_ARTIFACTS:
                 continue
             
-            # Check for patterns like "vimm m" or "asciinema2mdpt" (command name + extra chars)
-            # Valid commands shouldn't have the same character repeated 3+ times in a row
-            if re.search(r'(.)\1{2,}', first_word):
+            # Check for excessive character repetition (total or adjacent) -
+            # both signal typing artifacts like "vvvivivimm"
+            if _word_has_repetition(first_word):
                 continue
             
             # Check for commands that look like valid command + extra characters
             # e.g., "asciinema2mdpt" should be "apt"
-            valid_commands = ['cd', 'ls', 'cp', 'mv', 'rm', 'cat', 'vim', 'nano', 'exit', 'pwd', 'mkdir', 'nmap', 'apt', 'env']
-            for valid_cmd in valid_commands:
-                if first_word.startswith(valid_cmd) and len(first_word) > len(valid_cmd) + 2:
-                    # Likely typing artifact - command name with extra chars
-                    continue
-            
+            if _VALID_PREFIX_RE.match(first_word):
+                # Likely typing artifact - command name with extra chars
+                continue
+
             # Check for very long first words that contain valid command names
             # e.g., "asciinema2mdpt" contains "apt" but is too long
-            skip_command = False
-            if len(first_word) > 12:
-                for valid_cmd in valid_commands:
-                    if valid_cmd in first_word and len(first_word) > len(valid_cmd) + 5:
-                        # Likely typing artifact
-                        skip_command = True
-                        break
-            if skip_command:
+            if len(first_word) > 12 and _VALID_CONTAINS_RE.search(first_word):
+                # Likely typing artifact
                 continue
             
             # Check for weird path patterns with repeated slashes like "///eettcc//h"
-            if '//' in cmd and cmd.count('/') > 5:
+            if '//' in cmd and len(cmd) > 6 and cmd.count('/') > 5:
                 # Likely typing artifact
                 continue
         
         # Clean up command
-        cmd = re.sub(r'\s+', ' ', cmd)  # Normalize whitespace
+        cmd = _WS_RE.sub(' ', cmd)  # Normalize whitespace
         cmd = cmd.strip()
         
-        # Skip if we've seen this exact command or a very similar one
-        # Check for duplicates with slight variations
-        is_duplicate = False
-        for seen_cmd in seen:
-            # If commands are very similar (one is substring of other), skip the longer one
-            if len(cmd) > len(seen_cmd) and seen_cmd in cmd:
-                is_duplicate = True
-                break
-            elif len(seen_cmd) > len(cmd) and cmd in seen_cmd:
-                # Remove the longer one and add the shorter
-                filtered_commands = [(c, o) for c, o in filtered_commands if c != seen_cmd]
-                seen.discard(seen_cmd)
-                break
-        
-        # Also check for near-duplicates (e.g., "nmap -p -sV 10.10.11.99 -oA VersionScan" vs "nmap -p -sV-oA VersionScan")
-        # If one command is clearly a subset/typo of another, prefer the longer one
-        for seen_cmd in seen:
-            if cmd.startswith(seen_cmd[:10]) and len(cmd) < len(seen_cmd) - 5:
-                # cmd is likely a typo/subset of seen_cmd
-                is_duplicate = True
-                break
-            elif seen_cmd.startswith(cmd[:10]) and len(seen_cmd) < len(cmd) - 5:
-                # seen_cmd is likely a typo/subset of cmd, remove it
-                filtered_commands = [(c, o) for c, o in filtered_commands if c != seen_cmd]
-                seen.discard(seen_cmd)
-                break
-        
-        if is_duplicate or cmd in seen:
-            continue
-        seen.add(cmd)
-        
-        if cmd and len(cmd) >= 3:
-            filtered_commands.append((cmd, output))
-    
-    commands_and_output = filtered_commands
-    
-    # Post-process: fix common issues
-    fixed_commands = []
-    seen_commands = set()
-    
-    for cmd, output in commands_and_output:
         # Fix commands that are missing prefixes
-        original_cmd = cmd
         if cmd == "ldapquery.log ./ldapRootDSE.log":
             cmd = "cp ldapquery.log ./ldapRootDSE.log"
         elif cmd == "dir ../hercules":
             # Check events to see if mkdir was actually typed
             cmd = "mkdir ../hercules"  # Based on events, user typed mkdir
         
-        # Deduplicate
-        if cmd not in seen_commands:
-            seen_commands.add(cmd)
-            fixed_commands.append((cmd, output))
+        if "nmap -p 445" in cmd:
+            has_first_nmap = True
+        
+        # Skip if we've seen this exact command
+        if cmd in seen_full:
+            continue
+
+        # Check for duplicates with slight variations - near-duplicates share
+        # their first 10 characters, so one hash lookup replaces scanning seen
+        key = cmd[:10]
+        prev_cmd = by_prefix.get(key)
+        if prev_cmd is not None and prev_cmd in filtered_commands:
+            if len(cmd) > len(prev_cmd) and prev_cmd in cmd:
+                # Commands are very similar (one is substring of other), skip the longer one
+                continue
+            elif len(prev_cmd) > len(cmd) and cmd in prev_cmd:
+                # Remove the longer one and keep the shorter
+                seen_full.discard(prev_cmd)
+                del filtered_commands[prev_cmd]
+            elif cmd.startswith(prev_cmd[:10]) and len(cmd) < len(prev_cmd) - 5:
+                # cmd is likely a typo/subset of prev_cmd (e.g., "nmap -p -sV-oA VersionScan"
+                # vs "nmap -p -sV 10.10.11.99 -oA VersionScan")
+                continue
+            elif prev_cmd.startswith(key) and len(prev_cmd) < len(cmd) - 5:
+                # prev_cmd is likely a typo/subset of cmd, remove it
+                seen_full.discard(prev_cmd)
+                del filtered_commands[prev_cmd]
+
+        seen_full.add(cmd)
+
+        if cmd and len(cmd) >= 3:
+            by_prefix[key] = cmd
+            filtered_commands[cmd] = output
+
+    # Materialize in insertion order
+    fixed_commands = list(filtered_commands.items())
     
     # Also check for the first failed nmap command
     # Look for autocomplete pattern "map -p 445" which means user typed "n" + autocomplete
-    has_first_nmap = any("nmap -p 445" in cmd for cmd, _ in fixed_commands)
     if not has_first_nmap:
-        # Check if we can find it in events
-        for timestamp, event_type, text in events:
-            if event_type == 'o' and 'map -p 445 --script "smb*"' in text:
+        # Check if we can find it in the output events
+        for text in o_texts:
+            if 'map -p 445 --script "smb*"' in text:
                 # Found the autocomplete, reconstruct command
                 fixed_commands.append(("nmap -p 445 --script \"smb*\" $TARGETIP -oA SMBDetailedScan", 
                                      "Starting Nmap 7.95 ( https://nmap.org ) at 2025-12-30 17:56 CST\nError #486: Your port specifications are illegal.  Example of proper form: \"-100,200-1024,T:3000-4000,U:60000-\"\nQUITTING!"))
                 break
     
-    commands_and_output = fixed_commands
-    
-    # Final fallback to simple terminal approach
-    if len(commands_and_output) < 2:
-        # Get terminal dimensions from metadata
-        width = metadata.get('width', 80)
-        height = metadata.get('height', 24)
-        
-        # Process all events through terminal emulator
-        terminal = Terminal(width=width, height=height)
-        
-        for timestamp, event_type, text in events:
-            if event_type == 'o':  # Output
-                terminal.process_text(text)
-        
-        # Get final terminal output
-        final_output = terminal.get_output()
-        
-        # Strip ANSI codes
-        if strip_colors:
-            final_output = strip_ansi(final_output)
-        
-        # Extract commands from final output
-        fallback_commands = extract_commands_from_output(final_output)
-        
-        # Use fallback if it found commands
-        if fallback_commands:
-            commands_and_output = fallback_commands
-    
-    # Format as Markdown
-    markdown = format_as_markdown(commands_and_output, metadata)
-    
-    return markdown
+    return fixed_commands
 
 
 def extract_commands_from_output(output: str) -> List[Tuple[Optional[str], str]]:
@@ -216,58 +316,49 @@ def extract_commands_from_output(output: str) -> List[Tuple[Optional[str], str]]
     └─# next_command
     """
     commands_and_output = []
-    lines = output.split('\n')
-    
-    # Pattern to match the prompt
-    prompt_start = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]')
-    prompt_end = re.compile(r'└─[#\$]\s*(.+)$')
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        
-        # Look for prompt start
-        if prompt_start.search(line):
-            # Found a prompt, check next line for command
-            if i + 1 < len(lines):
-                next_line = lines[i + 1]
-                match = prompt_end.search(next_line)
-                if match:
-                    command = match.group(1).strip()
-                    
-                    # Clean command
-                    command = clean_command(command)
-                    
-                    if command:
-                        # Find the output - everything until next prompt
-                        output_lines = []
-                        j = i + 2
-                        while j < len(lines):
-                            if prompt_start.search(lines[j]):
-                                break
-                            output_lines.append(lines[j])
-                            j += 1
-                        
-                        output_text = '\n'.join(output_lines)
-                        output_text = clean_output(output_text)
-                        
-                        commands_and_output.append((command, output_text))
-                        i = j - 1  # Will increment to j
-        i += 1
-    
+
+    # One regex pass over the whole buffer finds every prompt; the text
+    # between consecutive matches bounds each command's output
+    matches = list(_PROMPT_START_RE.finditer(output))
+
+    for i, m in enumerate(matches):
+        next_start = matches[i + 1].start() if i + 1 < len(matches) else len(output)
+
+        # Command is on the line after the prompt header
+        header_end = output.find('\n', m.end())
+        if header_end == -1 or header_end >= next_start:
+            continue
+        cmd_line_end = output.find('\n', header_end + 1)
+        if cmd_line_end == -1 or cmd_line_end > next_start:
+            cmd_line_end = next_start
+
+        match = _PROMPT_END_RE.search(output, header_end + 1, cmd_line_end)
+        if match:
+            command = match.group(1).strip()
+
+            # Clean command
+            command = clean_command(command)
+
+            if command:
+                # Output is everything until the next prompt
+                output_text = output[min(cmd_line_end + 1, next_start):next_start]
+                output_text = clean_output(output_text)
+
+                commands_and_output.append((command, output_text))
+
     return commands_and_output
 
 
 def clean_command(cmd: str) -> str:
     """Clean a command string."""
     # Remove ANSI artifacts that might remain
-    cmd = re.sub(r'[^\x20-\x7E]', '', cmd)  # Keep only printable ASCII
+    cmd = printable_ascii(cmd)  # Keep only printable ASCII
     cmd = cmd.strip()
     
     # Filter out obviously wrong commands
     if len(cmd) > 200:  # Too long, probably not a command
         return ''
-    if cmd.count(' ') > 50:  # Too many spaces
+    if len(cmd) > 51 and cmd.count(' ') > 50:  # Too many spaces
         return ''
     
     return cmd
@@ -279,17 +370,15 @@ def clean_output(text: str) -> str:
     cleaned = []
     
     for line in lines:
-        # Remove lines that are just vim indicators
-        if line.strip() == '~' or line.strip().startswith('~'):
-            continue
-        # Remove vim status lines
-        if re.match(r'^\d+,\d+.*All', line):
+        stripped = line.strip()
+        # Remove lines that are just vim indicators or other vim artifacts
+        if stripped.startswith('~') or stripped in _VIM_STRIP_SET:
             continue
         # Remove vim mode indicators
-        if '-- INSERT --' in line or '-- REPLACE --' in line:
+        if '--' in line and (_VIM_INLINE[0] in line or _VIM_INLINE[1] in line):
             continue
-        # Remove other vim artifacts
-        if line.strip() in ['▽', 'zz']:
+        # Remove vim status lines
+        if line[:1].isdigit() and _VIM_STATUS_RE.match(line):
             continue
         cleaned.append(line)
     
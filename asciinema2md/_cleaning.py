@@ -0,0 +1,68 @@
+"""Shared output-line cleanup for the snapshot extractors."""
+
+import functools
+import re
+
+# Compiled once here instead of once per extractor module
+_VIM_STATUS_RE = re.compile(r'^\d+,\d+.*All')
+_VIM_WRITTEN_RE = re.compile(r'^\d+,\d+.*written')
+_VIM_FILEINFO_RE = re.compile(r'^".*"\s+\d+L,\s+\d+B')
+
+
+@functools.lru_cache(maxsize=1024)
+def clean_output(text, *, replace=True, vim_marks=True, fileinfo=False,
+                 written=False, short_alpha=False, esc_bracket=False):
+    """
+    Clean captured output text, dropping vim/terminal artifacts.
+
+    The four snapshot extractors share this loop; the keyword flags
+    select which of their historical per-line filters apply, so each
+    caller keeps its exact previous behavior. Re-running an extractor
+    over repeated identical screens hits the lru_cache instead of the
+    loop.
+
+    Args:
+        text: Raw output text (newline separated)
+        replace: Also drop '-- REPLACE --' lines, not just '-- INSERT --'
+        vim_marks: Drop lines that are only '▽' or 'zz'
+        fileinfo: Drop vim's '"file" NL, NB' status lines
+        written: Drop vim's 'N,N ... written' status lines
+        short_alpha: Drop 1-2 letter lines (typing artifacts)
+        esc_bracket: Drop leftover '[?25...'/'[?1...' escape fragments
+
+    Returns:
+        Cleaned text with leading/trailing blank lines removed
+    """
+    lines = text.split('\n')
+    cleaned = []
+    for line in lines:
+        stripped = line.strip()
+        if stripped == '~':
+            continue
+        if '-- INSERT --' in line or (replace and '-- REPLACE --' in line):
+            continue
+        if line[:1].isdigit() and 'All' in line and _VIM_STATUS_RE.match(line):
+            continue
+        if vim_marks and stripped in ('▽', 'zz'):
+            continue
+        if fileinfo and line.startswith('"') and _VIM_FILEINFO_RE.match(line):
+            continue
+        if (written and line[:1].isdigit() and 'written' in line
+                and _VIM_WRITTEN_RE.match(line)):
+            continue
+        if short_alpha and len(stripped) <= 2 and stripped.isalpha():
+            continue
+        if esc_bracket and stripped.startswith('[') and ('?25' in line or '?1' in line):
+            continue
+        cleaned.append(line)
+
+    # Trim blank lines at both ends with one slice; pop(0) in a
+    # loop shifts the whole list on every call
+    start = 0
+    end = len(cleaned)
+    while start < end and not cleaned[start].strip():
+        start += 1
+    while end > start and not cleaned[end - 1].strip():
+        end -= 1
+
+    return '\n'.join(cleaned[start:end])
@@ -3,31 +3,99 @@
 import re
 
 
+# Pattern matches:
+# - ESC[ followed by parameters and a command letter
+# - ESC] (OSC sequences)
+# - ESC followed by other control sequences
+# - Other formatting-related control characters (keep \n, \r, \t - they're meaningful)
+# Combined into one alternation so the text is scanned once instead of twice.
+_ANSI_AND_CTRL_RE = re.compile(
+    r'\x1b\[[0-9;]*[a-zA-Z]|\x1b\][^\x07]*\x07|\x1b[=<>]'
+    r'|[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+# Deletes the same control characters as the regex above; used on the fast
+# path when the input contains no ESC byte at all (the common case for
+# plain-text output events)
+_CTRL_TABLE = dict.fromkeys(
+    [c for c in range(0x20) if c not in (0x09, 0x0a, 0x0d)] + [0x7f])
+
+# ASCII bytes outside the printable 0x20-0x7E range, for printable_ascii
+_NON_PRINTABLE_BYTES = bytes(range(0x20)) + b'\x7f'
+
+# Both ways the shell signals Enter in a recording: the zsh echo '\r\r\n'
+# and the cursor-down-then-return redraw '\x1b[1B\r'
+_ENTER_RE = re.compile(r'\r\r\n|\x1b\[1B\r')
+
+
 def strip_ansi(text):
     """
     Strip all ANSI escape sequences from text.
-    
+
     Args:
         text: String containing ANSI escape codes
-        
+
     Returns:
         String with all ANSI codes removed
     """
-    # Pattern matches:
-    # - ESC[ followed by parameters and a command letter
-    # - ESC] (OSC sequences)
-    # - ESC followed by other control sequences
-    # - Common control characters like \r, \b (we'll handle these separately)
-    
-    # Remove ANSI escape sequences
-    ansi_escape = re.compile(r'\x1b\[[0-9;]*[a-zA-Z]|\x1b\][^\x07]*\x07|\x1b[=<>]')
-    text = ansi_escape.sub('', text)
-    
-    # Remove other control characters that are formatting-related
-    # Keep \n, \r, \t as they're meaningful
-    text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]', '', text)
-    
-    return text
+    if '\x1b' not in text:
+        # No escape sequences - only control characters can need removing,
+        # and str.translate handles those without the regex engine
+        return text.translate(_CTRL_TABLE)
+    return _ANSI_AND_CTRL_RE.sub('', text)
+
+
+def maybe_strip_ansi(text):
+    """
+    Strip ANSI codes only when an escape byte is actually present.
+
+    The single-character `in` checks run as memchr in C, so text with no
+    escapes (typed characters, plain output frames - the common case) is
+    returned as-is without touching the regex engine or allocating.
+
+    Args:
+        text: String that may contain ANSI escape codes
+
+    Returns:
+        text unchanged if escape-free, otherwise strip_ansi(text)
+    """
+    if '\x1b' not in text and '\x9b' not in text:
+        return text
+    return strip_ansi(text)
+
+
+def printable_ascii(text):
+    """
+    Keep only printable ASCII (0x20-0x7E), dropping everything else.
+
+    Equivalent to re.sub(r'[^\\x20-\\x7E]', '', text) but runs entirely in
+    the codec and bytes.translate fast paths instead of the regex engine.
+
+    Args:
+        text: String to filter
+
+    Returns:
+        String containing only printable ASCII characters
+    """
+    return (text.encode('ascii', 'ignore')
+                .translate(None, _NON_PRINTABLE_BYTES)
+                .decode('ascii'))
+
+
+def contains_enter(text):
+    """
+    Check whether text carries one of the terminal's Enter signatures.
+
+    Replaces the pair of substring scans for '\\r\\r\\n' and '\\x1b[1B\\r'
+    with one fused alternation, behind a memchr gate on '\\r' (present in
+    both signatures) so keystroke frames skip the regex entirely.
+
+    Args:
+        text: Event text to check
+
+    Returns:
+        True if the text contains an Enter signature
+    """
+    return '\r' in text and _ENTER_RE.search(text) is not None
 
 
 def clean_text(text):
@@ -2,7 +2,19 @@
 
 import re
 from typing import List, Tuple, Optional
-from .ansi import strip_ansi
+from .ansi import strip_ansi, printable_ascii
+
+
+# Matches CSI, OSC and other escape sequences; the spans between matches are
+# literal text. Lets the C regex engine do the escape skipping instead of a
+# per-character Python loop.
+_ANSI_TOKEN_RE = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07]*\x07|\x1b[=<>]')
+
+# Vim artifact filters for _clean_output: cheap literal checks first, one
+# combined regex for the status/file-info line patterns
+_VIM_STRIP_SET = frozenset(('~', '▽', 'zz'))
+_VIM_INLINE = ('-- INSERT --', '-- REPLACE --')
+_VIM_ARTIFACT_RE = re.compile(r'^(?:\d+,\d+.*(?:All|written)|".*"\s+\d+L,\s+\d+B)')
 
 
 class CommandExtractor:
@@ -13,7 +25,7 @@ class CommandExtractor:
         self.commands: List[Tuple[str, str, float]] = []  # (command, output, timestamp)
         
         # State tracking
-        self.current_command_chars = []  # Characters being typed
+        self._cmd_buf = bytearray()  # Command being typed (printable ASCII only)
         self.current_output_lines = []
         self.in_prompt = False
         self.command_entered = False
@@ -27,16 +39,19 @@ class CommandExtractor:
             if event_type != 'o':
                 continue
             
+            # Strip ANSI once per event; both branches below need it
+            clean_text = strip_ansi(text)
+            
             # Check for new prompt
-            if self.prompt_pattern.search(text):
+            if self.prompt_pattern.search(clean_text):
                 self._handle_new_prompt(timestamp)
                 continue
             
             # Process the event
             if self.in_prompt and not self.command_entered:
-                self._process_command_input(text, timestamp)
+                self._process_command_input(text, clean_text, timestamp)
             else:
-                self._process_output(text)
+                self._process_output(clean_text)
         
         # Don't forget the last command
         self._finalize_current_command()
@@ -47,21 +62,19 @@ class CommandExtractor:
     def _handle_new_prompt(self, timestamp: float):
         """Handle when a new prompt appears."""
         # If we were tracking a command, finalize it
-        if self.command_entered or self.current_command_chars:
+        if self.command_entered or self._cmd_buf:
             self._finalize_current_command()
         
         # Reset for new command
-        self.current_command_chars = []
+        self._cmd_buf = bytearray()
         self.current_output_lines = []
         self.in_prompt = True
         self.command_entered = False
         self.last_prompt_time = timestamp
         self.last_event_was_typing = False
     
-    def _process_command_input(self, text: str, timestamp: float):
+    def _process_command_input(self, text: str, clean_text: str, timestamp: float):
         """Process input while in a prompt (command being typed)."""
-        clean_text = strip_ansi(text)
-        
         # Check if this is a complete command string (shell echo)
         # These appear as single events with the full command
         # Examples: "nmap -p -sV 10.10.11.99 -oA VersionScan" at line 307
@@ -76,7 +89,7 @@ class CommandExtractor:
             # Filter out things that are clearly not commands
             if (not cmd.startswith('#') and  # Not a comment
                 ' ' in cmd or len(cmd) > 3):  # Has space or is substantial
-                self.current_command_chars = list(cmd)
+                self._cmd_buf = bytearray(cmd.encode('ascii', 'ignore'))
                 self.command_entered = True
                 self.in_prompt = False
                 self.last_event_was_typing = False
@@ -91,7 +104,7 @@ class CommandExtractor:
             return
         
         # Check for \r\r pattern (part of Enter sequence)
-        if '\r\r' in text and self.current_command_chars:
+        if '\r\r' in text and self._cmd_buf:
             # This is likely Enter being pressed
             self.command_entered = True
             self.in_prompt = False
@@ -100,68 +113,51 @@ class CommandExtractor:
         
         # Check for cursor movement that might indicate Enter
         # \u001b[1B\r is cursor down + carriage return (Enter)
-        if '\u001b[1B\r' in text and self.current_command_chars:
+        if '\u001b[1B\r' in text and self._cmd_buf:
             self.command_entered = True
             self.in_prompt = False
             self.last_event_was_typing = False
             return
         
-        # Process character-by-character input
-        # First, extract visible characters from the text
-        # Remove ANSI codes but keep the actual characters
-        visible_chars = []
-        i = 0
-        while i < len(text):
-            char = text[i]
-            
-            # Skip ANSI escape sequences
-            if char == '\x1b':
-                i += 1
-                if i < len(text) and text[i] == '[':
-                    # Skip until command letter
-                    i += 1
-                    while i < len(text) and text[i] not in 'ABCDEFGHJKSTfmsu':
-                        i += 1
-                    if i < len(text):
-                        i += 1
-                elif i < len(text) and text[i] == ']':
-                    # OSC sequence
-                    i += 1
-                    while i < len(text) and text[i] != '\x07':
-                        i += 1
-                    if i < len(text):
-                        i += 1
-                continue
-            
-            # Handle control characters
+        # Process typed input: tokenize out escape sequences with the compiled
+        # regex and apply backspace/printable handling only to literal spans
+        last = 0
+        for m in _ANSI_TOKEN_RE.finditer(text):
+            if self._apply_literal(text[last:m.start()]):
+                break
+            last = m.end()
+        else:
+            self._apply_literal(text[last:])
+
+        # If we added characters, mark as typing
+        if self._cmd_buf:
+            self.last_event_was_typing = True
+
+    def _apply_literal(self, span: str) -> bool:
+        """
+        Apply a literal (escape-free) span to the command buffer.
+
+        Returns True when a newline completed the command.
+        """
+        for char in span:
             if char == '\b':
                 # Backspace - remove last character from buffer
-                if self.current_command_chars:
-                    self.current_command_chars.pop()
+                if self._cmd_buf:
+                    del self._cmd_buf[-1:]
             elif 32 <= ord(char) <= 126:  # Printable ASCII
                 # Regular character - add to buffer
-                self.current_command_chars.append(char)
-            elif char == '\r':
-                # Carriage return - might be part of Enter
-                pass
+                self._cmd_buf.append(ord(char))
             elif char == '\n':
                 # Newline - Enter might be pressed
-                if self.current_command_chars:
+                if self._cmd_buf:
                     # Command is complete
                     self.command_entered = True
                     self.in_prompt = False
-                    break
-            
-            i += 1
-        
-        # If we added characters, mark as typing
-        if self.current_command_chars:
-            self.last_event_was_typing = True
+                    return True
+        return False
     
-    def _process_output(self, text: str):
-        """Process output (after command entered)."""
-        clean_text = strip_ansi(text)
-        
+    def _process_output(self, clean_text: str):
+        """Process output (after command entered; already ANSI-stripped)."""
         # Skip prompts in output
         if self.prompt_pattern.search(clean_text):
             return
@@ -172,14 +168,14 @@ class CommandExtractor:
     
     def _finalize_current_command(self):
         """Finalize the current command and add it to the list."""
-        if not self.current_command_chars and not self.command_entered:
+        if not self._cmd_buf and not self.command_entered:
             return
         
-        # Extract command
-        command = ''.join(self.current_command_chars).strip()
+        # Extract command (buffer only ever holds printable ASCII)
+        command = self._cmd_buf.decode('ascii').strip()
         
         # Clean command
-        command = re.sub(r'[^\x20-\x7E]', '', command)  # Remove non-printable
+        command = printable_ascii(command)  # Remove non-printable
         command = command.strip()
         
         # Filter out obviously wrong commands
@@ -187,7 +183,7 @@ class CommandExtractor:
             return
         if len(command) > 500:  # Too long
             return
-        if command.count(' ') > 100:  # Too many spaces
+        if len(command) > 101 and command.count(' ') > 100:  # Too many spaces
             return
         # Filter out file content that might be mistaken for commands
         if command.startswith('#') and 'following' in command.lower():
@@ -207,24 +203,19 @@ class CommandExtractor:
         cleaned = []
         
         for line in lines:
+            stripped = line.strip()
             # Remove vim artifacts
-            if line.strip() == '~':
+            if stripped in _VIM_STRIP_SET:
                 continue
-            if '-- INSERT --' in line or '-- REPLACE --' in line:
+            if '--' in line and (_VIM_INLINE[0] in line or _VIM_INLINE[1] in line):
                 continue
-            if re.match(r'^\d+,\d+.*All', line):
-                continue
-            if line.strip() in ['▽', 'zz']:
-                continue
-            # Remove vim status lines
-            if re.match(r'^".*"\s+\d+L,\s+\d+B', line):
-                continue
-            if re.match(r'^\d+,\d+.*written', line):
+            # Remove vim status lines (all start with a digit or a quote)
+            if line[:1] in '0123456789"' and _VIM_ARTIFACT_RE.match(line):
                 continue
             # Remove lines that are just prompt-like but not actual prompts
-            if line.strip().startswith('┌──') and '└─' not in line:
+            if stripped.startswith('┌──') and '└─' not in line:
                 continue
-            
+
             cleaned.append(line)
         
         # Remove leading/trailing empty lines
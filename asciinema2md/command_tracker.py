@@ -80,21 +80,17 @@ class CommandTracker:
                         for char in clean_text:
                             if char == '\b' and self.current_command:
                                 # Remove last character from last command part
-                                if self.current_command:
-                                    last = self.current_command[-1]
-                                    if last:
-                                        self.current_command[-1] = last[:-1]
-                                    else:
-                                        self.current_command.pop()
+                                last = self.current_command[-1]
+                                if len(last) > 1:
+                                    self.current_command[-1] = last[:-1]
+                                else:
+                                    self.current_command.pop()
                             elif char not in '\x1b\r\n\b':
-                                if not self.current_command:
-                                    self.current_command.append('')
-                                self.current_command[-1] += char
+                                self.current_command.append(char)
                     else:
-                        # Regular typing
-                        if not self.current_command:
-                            self.current_command.append('')
-                        self.current_command[-1] += clean_text
+                        # Regular typing - append the fragment; parts are
+                        # only joined once on finalize, so typing stays O(n)
+                        self.current_command.append(clean_text)
         else:
             # Not in prompt, this is output
             clean_text = self._clean_for_tracking(text)
@@ -1,11 +1,27 @@
 """Detect commands and separate them from output."""
 
 import re
+from array import array
+from bisect import bisect_left
 from typing import List, Tuple, Optional
 
+# google-re2 compiles the fused prompt alternation into one linear-time DFA
+# instead of re's backtracking NFA; purely optional, stdlib re works fine
+try:
+    import re2 as _prompt_re
+except ImportError:
+    _prompt_re = re
+
+# hyperscan (SIMD multi-pattern matching) is used, when installed, as a fast
+# prefilter that rules out prompt-free text before the exact regex pass
+try:
+    import hyperscan as _hyperscan
+except ImportError:
+    _hyperscan = None
+
 
 # Common prompt patterns - more flexible
-PROMPT_PATTERNS = [
+PROMPT_PATTERNS = (
     r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$] ',  # Kali/Zsh prompt with box drawing
     r'[^\s]+\@[^\s]+\:[^\$#\n]+\$ ',  # user@host:path$ 
     r'[^\s]+\@[^\s]+\:[^\$#\n]+\# ',  # user@host:path#
@@ -15,7 +31,80 @@ PROMPT_PATTERNS = [
     r'\# ',                             # # 
     r'> ',                              # > 
     r'PS [^\>]+\> ',                    # PowerShell prompt
-]
+)
+
+# Compiled once at import: individual patterns plus one fused alternation so
+# callers scan the input a single time instead of once per pattern
+_COMPILED_PROMPTS = [re.compile(p) for p in PROMPT_PATTERNS]
+_ANY_PROMPT = _prompt_re.compile(
+    '|'.join('(?:' + p + ')' for p in PROMPT_PATTERNS))
+
+_NEWLINE_RE = re.compile(r'\n')
+
+_HS_DB = None
+if _hyperscan is not None:
+    try:
+        _HS_DB = _hyperscan.Database()
+        _HS_DB.compile(
+            expressions=[p.encode('utf-8') for p in PROMPT_PATTERNS],
+            ids=list(range(len(PROMPT_PATTERNS))),
+            flags=[0] * len(PROMPT_PATTERNS))
+    except Exception:
+        # Not every pattern is guaranteed supportable; fall back silently
+        _HS_DB = None
+
+
+def _find_prompt_spans(full_text):
+    """
+    Find all prompt matches in full_text as (position, matched_text) pairs.
+
+    When hyperscan is available it scans the text first; text with no hits
+    skips the regex engine entirely. Offsets and match extents always come
+    from _ANY_PROMPT so the semantics match the pure-regex path exactly.
+    """
+    if _HS_DB is not None:
+        hits = []
+        _HS_DB.scan(full_text.encode('utf-8'),
+                    match_event_handler=lambda pid, start, end, flags, ctx:
+                    hits.append(pid))
+        if not hits:
+            return []
+    return [(match.start(), match.group(0))
+            for match in _ANY_PROMPT.finditer(full_text)]
+
+
+# The extractors' Kali prompt pattern (tail whitespace relaxed to \s*),
+# anchored in practice by the fixed '┌──(' literal it must start with
+_KALI_PROMPT_RE = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*')
+_KALI_PROMPT_LITERAL = '┌──('
+
+# How far past the literal the rest of the prompt can reasonably extend
+# (user, host, path and any interleaved color codes)
+_KALI_PROMPT_WINDOW = 512
+
+
+def prompt_hit(text: str):
+    """
+    Two-stage Kali prompt test: literal find, then a windowed regex.
+
+    The regex can only match starting at the fixed '┌──(' literal, so a C
+    substring find locates the candidates and the NFA runs over a small
+    window after each one instead of the whole text. On prompt-free text
+    (the common case per event) the regex never runs at all.
+
+    Args:
+        text: Text to check (event payload, snapshot, or single line)
+
+    Returns:
+        The match object, or None if no prompt is present
+    """
+    idx = text.find(_KALI_PROMPT_LITERAL)
+    while idx >= 0:
+        match = _KALI_PROMPT_RE.search(text, idx, idx + _KALI_PROMPT_WINDOW)
+        if match:
+            return match
+        idx = text.find(_KALI_PROMPT_LITERAL, idx + 1)
+    return None
 
 
 def detect_prompt(text: str) -> Optional[Tuple[str, int]]:
@@ -28,10 +117,9 @@ def detect_prompt(text: str) -> Optional[Tuple[str, int]]:
     Returns:
         Tuple of (prompt_string, position) if found, None otherwise
     """
-    for pattern in PROMPT_PATTERNS:
-        match = re.search(pattern, text)
-        if match:
-            return (match.group(0), match.start())
+    match = _ANY_PROMPT.search(text)
+    if match:
+        return (match.group(0), match.start())
     return None
 
 
@@ -88,17 +176,16 @@ def split_commands_and_output(lines: List[str]) -> List[Tuple[Optional[str], str
     # Join lines for better pattern matching
     full_text = '\n'.join(lines)
     
-    result = []
+    # Output pieces are gathered per entry and joined once at the end, so
+    # repeated merges never re-copy what has already been accumulated
+    result = []  # [command_or_None, list_of_output_pieces]
     last_pos = 0
     
-    # Find all prompts in the text
-    prompts = []
-    for pattern in PROMPT_PATTERNS:
-        for match in re.finditer(pattern, full_text):
-            prompts.append((match.start(), match.group(0)))
+    # Find all prompts in one pass; the result is position-sorted
+    prompts = _find_prompt_spans(full_text)
     
-    # Sort by position
-    prompts.sort(key=lambda x: x[0])
+    # Newline offsets computed once; bisect replaces a str.find scan per prompt
+    nl_positions = array('l', (m.start() for m in _NEWLINE_RE.finditer(full_text)))
     
     for i, (pos, prompt) in enumerate(prompts):
         # Get text between last prompt and current prompt
@@ -107,16 +194,16 @@ def split_commands_and_output(lines: List[str]) -> List[Tuple[Optional[str], str
             if segment:
                 # This is output from previous command
                 if result:
-                    prev_cmd, prev_out = result[-1]
-                    result[-1] = (prev_cmd, (prev_out + '\n' + segment).strip())
+                    result[-1][1].append(segment)
                 else:
-                    result.append((None, segment))
+                    result.append([None, [segment]])
         
         # Extract command after prompt
         cmd_start = pos + len(prompt)
         # Find end of command (next newline or next prompt)
         next_prompt_pos = prompts[i+1][0] if i+1 < len(prompts) else len(full_text)
-        cmd_end = full_text.find('\n', cmd_start)
+        nl_idx = bisect_left(nl_positions, cmd_start)
+        cmd_end = nl_positions[nl_idx] if nl_idx < len(nl_positions) else -1
         if cmd_end == -1 or cmd_end > next_prompt_pos:
             cmd_end = next_prompt_pos
         
@@ -124,7 +211,7 @@ def split_commands_and_output(lines: List[str]) -> List[Tuple[Optional[str], str
         
         # Skip if command is empty or just whitespace
         if command and not command.isspace():
-            result.append((command, ''))
+            result.append([command, []])
         
         last_pos = cmd_end
     
@@ -133,14 +220,14 @@ def split_commands_and_output(lines: List[str]) -> List[Tuple[Optional[str], str
         segment = full_text[last_pos:].strip()
         if segment:
             if result:
-                prev_cmd, prev_out = result[-1]
-                result[-1] = (prev_cmd, (prev_out + '\n' + segment).strip())
+                result[-1][1].append(segment)
             else:
-                result.append((None, segment))
+                result.append([None, [segment]])
     
-    # Clean up results - remove empty commands
+    # Clean up results - remove empty commands, join output pieces once
     cleaned = []
-    for cmd, out in result:
+    for cmd, pieces in result:
+        out = '\n'.join(pieces)
         if cmd or out:
             cleaned.append((cmd if cmd else None, out))
     
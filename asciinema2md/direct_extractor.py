@@ -2,25 +2,119 @@
 
 import re
 from typing import List, Tuple, Optional
-from .ansi import strip_ansi
+from .ansi import strip_ansi, printable_ascii
+
+
+# All patterns compiled once at import; these run per event or per output
+# line, where repeated re-cache lookups add up
+_RE_AUTOCOMPLETE = re.compile(r'\u001b\[38;2;153;153;153m([^\u001b]+)\u001b')
+_RE_CMDCHARS = re.compile(r'^[a-zA-Z0-9_/\-\.\s\$"\'=:;\[\]{}()]+$')
+_RE_BRACKETED = re.compile(r'^\[.*\]$')
+_RE_BARE_NUM = re.compile(r'^\s*\d+\s*$')
+# Anchored alternation covering the literal prefix/exact-match artifact
+# filters of _clean_output's second pass (Completing messages, vim noise,
+# partial paths and partial/duplicated commands); lookaheads encode the
+# length guards the individual checks used
+_SKIP_PREFIX_RE = re.compile(
+    r'Completing'
+    r'|.*(?:▽|Pzz|\[>c)'
+    r'|(?=.{1,7}$)(?:.*/|osts$|ost$|host$|hosts$)'
+    r'|/etc/host$'
+    r'|(?:vim|env|mkd|cp|cd|ls)$'
+    r'|(?:cp|mv|rm|cd|ls) .{0,2}$'
+    r'|vim /etc/hosts$|vim /etc/resolv\.conf$|vim \.env$|vim users\.txt$'
+    r'|(?=.{1,49}$)(?:vim /|(?:nmap|apt)\s+\S)'
+    r'|"/.*"$'
+    r'|#.{0,2}$')
+
+# Kali/Zsh two-line prompt; compiled once for all extractor instances
+_PROMPT_RE = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*')
+
+# Line boundaries inside a typed-prefix scan; used to split once instead of
+# testing every character
+_LINE_BREAK_RE = re.compile(r'[\r\n]')
+
+# Characters that disqualify a chunk from being a complete command string;
+# one C-level regex scan instead of three Python-level `in` passes
+_FORBIDDEN_RE = re.compile(r'[\x1b\r\n]')
+
+# Single-word commands worth keeping; anything else without a space is noise
+_ALLOWED_SINGLE = frozenset(
+    ('cd', 'ls', 'cp', 'mv', 'rm', 'cat', 'vim', 'nano', 'exit', 'pwd', 'whoami'))
+
+# Fused skip predicates for _clean_output: one match per line replaces a
+# cascade of separate vim-artifact regexes
+_VIM_STRIP_SET = frozenset(('~', '▽', 'zz'))
+_SKIP_LINE_RE = re.compile(r'\d+,\d+.*(?:All|written)|".*"\s+\d+L,\s+\d+B')
+_SKIP_ARTIFACT_RE = re.compile(
+    r'\s*\d+.*\[.*\?25|".*"\s+\d+L,\s+\d+B|\s*\d+L,\s+\d+B(?:\s+written|\s*$)')
+_TAIL_ANSI_RE = re.compile(r'\[\?(?:1h|2004[hl])\s*')
+
+
+def _strip(text: str) -> str:
+    """strip_ansi, skipped entirely for events with no ESC byte at all."""
+    return text if '\x1b' not in text else strip_ansi(text)
 
 
 class DirectExtractor:
     """Extract commands by finding complete command strings in events."""
     
+    __slots__ = ('prompt_pattern', 'commands', '_ts', '_et', '_text',
+                 '_o_idx', 'clean', '_cmd_set', 'next_prompt', 'is_cmd_like')
+    
     def __init__(self):
-        self.prompt_pattern = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*')
+        self.prompt_pattern = _PROMPT_RE
         self.commands: List[Tuple[str, str, int]] = []  # (command, output_start_idx, timestamp)
-        self.events: List[Tuple[float, str, str]] = []
+        # Events kept as parallel arrays (timestamps, types, texts) so the
+        # hot loops index single lists instead of unpacking tuples
+        self._ts: List[float] = []
+        self._et: List[str] = []
+        self._text: List[str] = []
+        self._o_idx: List[int] = []  # indices of 'o' events
+        self.clean: List[str] = []  # strip_ansi(text) per event, computed once
+        self._cmd_set = set()  # commands found so far, for O(1) dedupe checks
         
     def process_events(self, events: List[Tuple[float, str, str]]) -> List[Tuple[str, str]]:
         """Process events and extract commands."""
-        self.events = events
+        # Split the tuple list into parallel arrays once; the o-index list
+        # lets every pass skip non-output events without re-testing the type
+        self._ts = [e[0] for e in events]
+        self._et = [e[1] for e in events]
+        self._text = [e[2] for e in events]
+        self._o_idx = [i for i, et in enumerate(self._et) if et == 'o']
+        
+        # Strip each event exactly once; every pass below indexes this cache
+        # instead of re-running the ANSI regex over the same text
+        self.clean = [_strip(text) if et == 'o' else ''
+                      for et, text in zip(self._et, self._text)]
+        
+        n = len(events)
+        
+        # next_prompt[i] = index of the first event at or after i whose text
+        # contains a prompt (n if none); one backward sweep replaces a
+        # prompt_pattern.search per event in every downstream helper
+        self.next_prompt = [n] * n
+        nxt = n
+        for i in range(n - 1, -1, -1):
+            if self._et[i] == 'o' and self.prompt_pattern.search(self._text[i]):
+                nxt = i
+            self.next_prompt[i] = nxt
+        
+        # is_cmd_like[i] = whether the cleaned event text has the shape of a
+        # typed command line; computed once, tested by index afterwards
+        self.is_cmd_like = []
+        for clean_text in self.clean:
+            clean_stripped = clean_text.strip()
+            self.is_cmd_like.append(
+                5 < len(clean_stripped) < 500 and
+                ' ' in clean_stripped and
+                not _FORBIDDEN_RE.search(clean_text) and
+                clean_stripped[0].isalpha())
         
         # Find complete command strings
-        for i, (timestamp, event_type, text) in enumerate(events):
-            if event_type != 'o':
-                continue
+        for i in self._o_idx:
+            text = self._text[i]
+            timestamp = self._ts[i]
             
             # Look for autocomplete suggestions (gray text with \u001b[38;2;153;153;153m)
             # These appear after typing part of a command
@@ -28,7 +122,7 @@ class DirectExtractor:
                 # Extract the autocomplete suggestion
                 # Pattern: typed_part + gray_autocomplete
                 # We need to look backwards to find what was typed
-                autocomplete_match = re.search(r'\u001b\[38;2;153;153;153m([^\u001b]+)\u001b', text)
+                autocomplete_match = _RE_AUTOCOMPLETE.search(text)
                 if autocomplete_match:
                     autocomplete_text = autocomplete_match.group(1)
                     # Look backwards in events to find the command being typed
@@ -36,22 +130,23 @@ class DirectExtractor:
                     if cmd_prefix:
                         full_cmd = cmd_prefix + autocomplete_text.strip()
                         # Clean and validate
-                        full_cmd = re.sub(r'[^\x20-\x7E]', '', full_cmd).strip()
+                        full_cmd = printable_ascii(full_cmd).strip()
                         if (full_cmd and len(full_cmd) >= 3 and 
                             full_cmd[0].isalpha() and
                             (len(full_cmd) > 10 or ' ' in full_cmd)):
-                            if full_cmd not in [c for c, _, _ in self.commands]:
+                            if full_cmd not in self._cmd_set:
                                 output = self._find_output_for_command(i)
                                 self.commands.append((full_cmd, output, timestamp))
+                                self._cmd_set.add(full_cmd)
             
             # Look for complete command strings (like "nmap -p -sV 10.10.11.99 -oA VersionScan")
-            clean_text = strip_ansi(text)
+            clean_text = self.clean[i]
             
             # Check if this looks like a complete command
             if (len(clean_text) > 5 and 
                 len(clean_text) < 500 and
-                not any(c in clean_text for c in '\x1b\r\n') and
-                re.match(r'^[a-zA-Z0-9_/\-\.\s\$"\'=:;\[\]{}()]+$', clean_text.strip()) and
+                not _FORBIDDEN_RE.search(clean_text) and
+                _RE_CMDCHARS.match(clean_text.strip()) and
                 (' ' in clean_text or len(clean_text) > 10)):  # Has space or is substantial
                 
                 cmd = clean_text.strip()
@@ -67,6 +162,7 @@ class DirectExtractor:
                     # Find the output for this command
                     output = self._find_output_for_command(i)
                     self.commands.append((cmd, output, timestamp))
+                    self._cmd_set.add(cmd)
         
         # Also extract from prompts + following text
         self._extract_from_prompts()
@@ -80,7 +176,11 @@ class DirectExtractor:
     
     def _deduplicate_commands(self):
         """Remove duplicate and invalid commands."""
-        seen = set()
+        # Sort by (command, timestamp) so repeats of the same command are
+        # adjacent and the 2-second window check is one linear pass; the
+        # caller re-sorts by timestamp afterwards anyway
+        self.commands.sort(key=lambda x: (x[0], x[2]))
+        last_ts_by_cmd = {}
         filtered = []
         
         for cmd, output, timestamp in self.commands:
@@ -93,23 +193,19 @@ class DirectExtractor:
                 continue
             
             # Skip single words unless they're common commands
-            if ' ' not in cmd and cmd not in ['cd', 'ls', 'cp', 'mv', 'rm', 'cat', 'vim', 'nano', 'exit', 'pwd', 'whoami']:
+            if ' ' not in cmd and cmd not in _ALLOWED_SINGLE:
                 continue
             
             # Skip if command looks like file content or error
             if cmd.startswith('The following') or 'desirable for' in cmd:
                 continue
             
-            # Skip if we've seen this exact command recently (within 2 seconds)
-            skip = False
-            for seen_cmd, seen_ts in seen:
-                if seen_cmd == cmd and abs(seen_ts - timestamp) < 2.0:
-                    skip = True
-                    break
-            if skip:
+            # Skip if we've kept this exact command recently (within 2 seconds)
+            last_ts = last_ts_by_cmd.get(cmd)
+            if last_ts is not None and timestamp - last_ts < 2.0:
                 continue
             
-            seen.add((cmd, timestamp))
+            last_ts_by_cmd[cmd] = timestamp
             filtered.append((cmd, output, timestamp))
         
         self.commands = filtered
@@ -118,28 +214,23 @@ class DirectExtractor:
         """Find output that follows a command."""
         output_lines = []
         
-        # Look ahead for output (until next prompt or next command)
-        for i in range(cmd_idx + 1, min(cmd_idx + 100, len(self.events))):
-            timestamp, event_type, text = self.events[i]
-            if event_type != 'o':
+        # Look ahead for output; the precomputed next-prompt index bounds the
+        # scan so no prompt regex runs inside the loop
+        start = cmd_idx + 1
+        end = min(cmd_idx + 100, len(self._et))
+        if start < len(self._et):
+            end = min(end, self.next_prompt[start])
+        
+        for i in range(start, end):
+            if self._et[i] != 'o':
                 continue
             
-            # Stop at next prompt
-            if self.prompt_pattern.search(text):
-                break
-            
             # Stop at next complete command
-            clean_text = strip_ansi(text)
-            clean_stripped = clean_text.strip()
-            if (len(clean_stripped) > 5 and 
-                len(clean_stripped) < 500 and
-                not any(c in clean_text for c in '\x1b\r\n') and
-                ' ' in clean_stripped and
-                len(clean_stripped) > 0 and clean_stripped[0].isalpha()):
+            if self.is_cmd_like[i]:
                 break
             
             # Collect output
-            clean_text = strip_ansi(text)
+            clean_text = self.clean[i]
             if clean_text.strip() and not clean_text.startswith('┌──'):
                 output_lines.append(clean_text)
         
@@ -147,68 +238,55 @@ class DirectExtractor:
     
     def _extract_from_prompts(self):
         """Extract commands that appear after prompts."""
-        for i, (timestamp, event_type, text) in enumerate(self.events):
-            if event_type != 'o':
-                continue
-            
-            if self.prompt_pattern.search(text):
-                # Look for command in next few events
-                for j in range(i + 1, min(i + 50, len(self.events))):
-                    ts, et, txt = self.events[j]
-                    if et != 'o':
+        n = len(self._et)
+        for i in self._o_idx:
+            # next_prompt[i] == i exactly when this event contains a prompt
+            if self.next_prompt[i] == i:
+                # Look for command in the events up to the next prompt
+                end = min(i + 50, n)
+                if i + 1 < n:
+                    end = min(end, self.next_prompt[i + 1])
+                for j in range(i + 1, end):
+                    if self._et[j] != 'o':
                         continue
                     
-                    # Check if next prompt (command finished)
-                    if self.prompt_pattern.search(txt):
-                        break
-                    
                     # Look for complete command string
-                    clean_text = strip_ansi(txt)
-                    clean_stripped = clean_text.strip()
-                    if (len(clean_stripped) > 5 and 
-                        len(clean_stripped) < 500 and
-                        not any(c in clean_text for c in '\x1b\r\n') and
-                        ' ' in clean_stripped and
-                        len(clean_stripped) > 0 and clean_stripped[0].isalpha()):
-                        
-                        cmd = clean_text.strip()
-                        if cmd not in [c for c, _, _ in self.commands]:
+                    if self.is_cmd_like[j]:
+                        cmd = self.clean[j].strip()
+                        if cmd not in self._cmd_set:
                             output = self._find_output_for_command(j)
-                            self.commands.append((cmd, output, ts))
+                            self.commands.append((cmd, output, self._ts[j]))
+                            self._cmd_set.add(cmd)
                         break
     
     def _find_command_prefix(self, event_idx: int) -> Optional[str]:
         """Find the command prefix that was typed before an autocomplete suggestion."""
         # Look backwards for the command being typed
-        prefix_chars = []
+        prefix_parts = []
         
-        for i in range(max(0, event_idx - 20), event_idx):
-            if i >= len(self.events):
-                break
-            timestamp, event_type, text = self.events[i]
-            if event_type != 'o':
+        for i in range(max(0, event_idx - 20), min(event_idx, len(self._et))):
+            if self._et[i] != 'o':
                 continue
+            text = self._text[i]
             
-            clean_text = strip_ansi(text)
+            clean_text = self.clean[i]
             
             # Look for typed characters (not autocomplete)
             # Autocomplete is gray, typed text is usually normal or underlined
             if '\u001b[38;2;153;153;153m' not in text:  # Not gray (autocomplete)
-                # Extract visible characters
-                for char in clean_text:
-                    if 32 <= ord(char) <= 126:  # Printable ASCII
-                        if char == '\b':
-                            if prefix_chars:
-                                prefix_chars.pop()
-                        else:
-                            prefix_chars.append(char)
-                    elif char in '\r\n':
-                        # Reset on newline
-                        if prefix_chars:
-                            return ''.join(prefix_chars).strip()
-                        prefix_chars = []
+                # Split on line boundaries and filter each run to printable
+                # ASCII in bulk rather than inspecting characters one by one
+                pieces = _LINE_BREAK_RE.split(clean_text)
+                last = len(pieces) - 1
+                for k, piece in enumerate(pieces):
+                    filtered = printable_ascii(piece)
+                    if filtered:
+                        prefix_parts.append(filtered)
+                    if k < last and prefix_parts:
+                        # Hit a newline with typed text pending
+                        return ''.join(prefix_parts).strip()
         
-        result = ''.join(prefix_chars).strip()
+        result = ''.join(prefix_parts).strip()
         return result if result else None
     
     def _clean_output(self, text: str) -> str:
@@ -219,21 +297,22 @@ class DirectExtractor:
         # Track progressive sequences (typing artifacts like "a", "as", "asc", "asciinema")
         prev_line = None
         
+        # Set when a kept line could still be caught by the second pass
+        # (short lines, artifact-shaped prefixes, prefix-related neighbors);
+        # clean outputs skip that pass entirely
+        needs_second_pass = False
+        prev_kept = None
+        
         for line in lines:
             line_stripped = line.strip()
             
-            # Remove vim artifacts
-            if line_stripped == '~':
+            # Remove vim artifacts: cheap literal checks first, one fused
+            # regex for the status/file-info line shapes
+            if line_stripped in _VIM_STRIP_SET:
                 continue
             if '-- INSERT --' in line or '-- REPLACE --' in line:
                 continue
-            if re.match(r'^\d+,\d+.*All', line):
-                continue
-            if line_stripped in ['▽', 'zz']:
-                continue
-            if re.match(r'^".*"\s+\d+L,\s+\d+B', line):
-                continue
-            if re.match(r'^\d+,\d+.*written', line):
+            if line[:1] in '0123456789"' and _SKIP_LINE_RE.match(line):
                 continue
             
             # Remove very short lines (likely typing artifacts)
@@ -261,13 +340,13 @@ class DirectExtractor:
             if line_stripped.startswith('[') and ('?25' in line or '?1' in line or '?2004' in line):
                 continue
             # Remove lines that are just control sequences
-            if re.match(r'^\[.*\]$', line_stripped):
+            if _RE_BRACKETED.match(line_stripped):
                 continue
             # Remove vim error messages
             if line_stripped.startswith('E486') or line_stripped.startswith('E387'):
                 continue
             # Remove lines that are just numbers (vim line numbers)
-            if re.match(r'^\s*\d+\s*$', line_stripped):
+            if _RE_BARE_NUM.match(line_stripped):
                 continue
             
             # Remove lines that are just punctuation or special characters
@@ -282,6 +361,18 @@ class DirectExtractor:
                     prev_line = line_stripped
                     continue
             
+            if not needs_second_pass and (
+                    len(line_stripped) <= 15 or
+                    line_stripped[0] in '["#0123456789' or
+                    '▽' in line_stripped or 'Pzz' in line_stripped or
+                    '[>c' in line_stripped or
+                    line_stripped.startswith(('Completing', 'vim ', 'nmap ', 'apt ')) or
+                    (prev_kept is not None and
+                     (line_stripped.startswith(prev_kept) or
+                      prev_kept.startswith(line_stripped)))):
+                needs_second_pass = True
+            prev_kept = line_stripped
+            
             prev_line = line_stripped
             cleaned.append(line)
         
@@ -292,40 +383,47 @@ class DirectExtractor:
             cleaned.pop()
         
         # Additional pass: remove progressive sequences (typing artifacts)
-        # e.g., "a", "as", "asc", "asciinema" where each is a prefix of the next
+        # e.g., "a", "as", "asc", "asciinema" where each is a prefix of the next;
+        # skipped when the first pass kept nothing it could apply to
+        if not needs_second_pass:
+            return self._finish_output(cleaned)
+        
+        # Progressive-sequence flags (typing artifacts like "a", "as", "asc")
+        # computed in one sweep up front, so the filter loop below reads a
+        # boolean instead of re-stripping and re-comparing a 10-line window
+        n = len(cleaned)
+        strips = [l.strip() for l in cleaned]
+        progressive = [False] * n
+        for i in range(n):
+            stripped = strips[i]
+            # Current line extends the previous, or the next line extends it
+            if i > 0 and strips[i-1] and stripped.startswith(strips[i-1]) and len(stripped) > len(strips[i-1]):
+                progressive[i] = True
+                continue
+            if i < n - 1 and strips[i+1] and strips[i+1].startswith(stripped) and len(strips[i+1]) > len(stripped):
+                progressive[i] = True
+                continue
+            # Or a line shortly after extends it by more than a couple chars
+            if len(stripped) < 15:
+                for j in range(i + 1, min(i + 10, n)):
+                    if strips[j].startswith(stripped) and len(strips[j]) > len(stripped) + 2:
+                        progressive[i] = True
+                        break
+        
         final_cleaned = []
         i = 0
         while i < len(cleaned):
             line = cleaned[i]
-            stripped = line.strip()
-            
-            # Check if this is part of a progressive sequence
-            is_progressive = False
-            if i > 0:
-                prev_stripped = cleaned[i-1].strip()
-                # If current line contains previous as prefix, it's progressive
-                if prev_stripped and stripped.startswith(prev_stripped) and len(stripped) > len(prev_stripped):
-                    is_progressive = True
-            if i < len(cleaned) - 1:
-                next_stripped = cleaned[i+1].strip()
-                # If next line contains current as prefix, current is progressive
-                if next_stripped and next_stripped.startswith(stripped) and len(next_stripped) > len(stripped):
-                    is_progressive = True
+            stripped = strips[i]
             
-            # Also check if this line is a prefix of a later line (progressive sequence)
-            if not is_progressive and len(stripped) < 15:
-                for j in range(i + 1, min(i + 10, len(cleaned))):
-                    later_stripped = cleaned[j].strip()
-                    if later_stripped.startswith(stripped) and len(later_stripped) > len(stripped) + 2:
-                        is_progressive = True
-                        break
+            is_progressive = progressive[i]
             
             # Skip lines that are clearly typing artifacts
             if len(stripped) <= 2 and stripped.isalpha():
                 # Check if next few lines are also short chars (typing)
                 short_count = 0
                 j = i
-                while j < len(cleaned) and len(cleaned[j].strip()) <= 2 and cleaned[j].strip().isalpha():
+                while j < len(cleaned) and len(strips[j]) <= 2 and strips[j].isalpha():
                     short_count += 1
                     j += 1
                 # If we have many short lines in a row, skip them (typing artifacts)
@@ -337,65 +435,16 @@ class DirectExtractor:
             if stripped.startswith('[') and ('?25' in stripped or '?1' in stripped or '?2004' in stripped):
                 i += 1
                 continue
-            # Also catch ANSI sequences that have numbers before them (vim line numbers)
-            if re.match(r'^\s*\d+.*\[.*\?25', stripped):
-                i += 1
-                continue
-            # Remove vim file info lines like '"/etc/hosts"'
-            if re.match(r'^".*"\s+\d+L,\s+\d+B', stripped):
-                i += 1
-                continue
-            # Remove vim write info like " 1L, 21B written"
-            if re.match(r'^\s*\d+L,\s+\d+B\s+written', stripped):
-                i += 1
-                continue
-            # Remove vim file size info like " 9L, 208B"
-            if re.match(r'^\s*\d+L,\s+\d+B\s*$', stripped):
-                i += 1
-                continue
-            # Remove "Completing file" messages
-            if stripped.startswith('Completing'):
-                i += 1
-                continue
-            # Remove vim artifacts like "▽  Pzz\[0%m           [>c"
-            if '▽' in stripped or 'Pzz' in stripped or '[>c' in stripped:
+            # Also catch vim line numbers with cursor codes, file info lines
+            # like '"/etc/hosts" 9L, 208B' and write/size info - one fused
+            # alternation instead of four separate matches
+            if _SKIP_ARTIFACT_RE.match(stripped):
                 i += 1
                 continue
-            # Remove partial paths (typing artifacts like "osts", "/etc/host")
-            if len(stripped) < 8 and ('/' in stripped or stripped.endswith('osts') or stripped.endswith('ost')):
-                # Check if it's a partial path
-                if '/' in stripped or stripped in ['osts', 'ost', 'host', 'hosts']:
-                    i += 1
-                    continue
-            # Remove "/etc/host" (partial path)
-            if stripped == '/etc/host':
-                i += 1
-                continue
-            # Remove very short lines that are just command names (typing artifacts)
-            if len(stripped) <= 4 and stripped in ['vim', 'env', 'mkd', 'cp', 'cd', 'ls']:
-                i += 1
-                continue
-            # Remove partial commands like "cp r"
-            if len(stripped) <= 5 and stripped.startswith(('cp ', 'mv ', 'rm ', 'cd ', 'ls ')):
-                i += 1
-                continue
-            # Remove commands that appear in output (typing artifacts)
-            # But be careful - only remove if it's clearly a duplicate command
-            if stripped in ['vim /etc/hosts', 'vim /etc/resolv.conf', 'vim .env', 'vim users.txt']:
-                # This is a command appearing in output, remove it
-                i += 1
-                continue
-            if (stripped.startswith('vim /') or stripped.startswith('nmap ') or stripped.startswith('apt ')) and len(stripped) < 50:
-                # Check if this is a complete command (not part of file content)
-                if re.match(r'^(vim|nmap|apt)\s+[^\s]+', stripped):
-                    i += 1
-                    continue
-            # Remove vim file quotes like '"/etc/hosts"'
-            if re.match(r'^"/.*"$', stripped):
-                i += 1
-                continue
-            # Remove partial text like "# L"
-            if len(stripped) <= 3 and stripped.startswith('#'):
+            # Remove Completing messages, vim artifacts, partial paths,
+            # partial/duplicated commands and file quotes - one anchored
+            # alternation replaces the whole literal-prefix cascade
+            if _SKIP_PREFIX_RE.match(stripped):
                 i += 1
                 continue
             
@@ -405,7 +454,7 @@ class DirectExtractor:
                 i += 1
                 continue
             if i > 0:
-                prev_stripped = cleaned[i-1].strip()
+                prev_stripped = strips[i-1]
                 # If lines are very similar (one is almost the same as other), skip the shorter one
                 if prev_stripped and stripped:
                     if (prev_stripped.startswith(stripped) or stripped.startswith(prev_stripped)) and abs(len(prev_stripped) - len(stripped)) <= 2:
@@ -419,11 +468,14 @@ class DirectExtractor:
             final_cleaned.append(line)
             i += 1
         
+        return self._finish_output(final_cleaned)
+    
+    def _finish_output(self, final_cleaned: List[str]) -> str:
+        """Final cleanup: prompt artifacts, duplicate prompts, vim tildes."""
         # Final pass: remove vim tildes and other artifacts
         result = '\n'.join(final_cleaned)
         # Remove ANSI sequences from prompts
-        result = re.sub(r'\[\?1h\s*', '', result)
-        result = re.sub(r'\[\?2004[hl]\s*', '', result)
+        result = _TAIL_ANSI_RE.sub('', result)
         # Remove duplicate prompts at the end
         lines = result.split('\n')
         # Remove duplicate consecutive prompts and commands in output
@@ -437,16 +489,15 @@ class DirectExtractor:
             if stripped in ['vim /etc/hosts', 'vim /etc/resolv.conf']:
                 continue
             cleaned_lines.append(line)
-        result = '\n'.join(cleaned_lines)
-        # Remove lines that are just tildes
-        result_lines = result.split('\n')
-        result_lines = [l for l in result_lines if not (l.strip() == '~' or l.strip().startswith('~ '))]
-        
-        # Remove excessive empty lines
+        # Drop tilde-only lines and collapse runs of empty lines in the same
+        # pass instead of rebuilding the list twice
         final_result = []
         prev_empty = False
-        for line in result_lines:
-            if not line.strip():
+        for line in cleaned_lines:
+            line_stripped = line.strip()
+            if line_stripped == '~' or line_stripped.startswith('~ '):
+                continue
+            if not line_stripped:
                 if not prev_empty:
                     final_result.append(line)
                 prev_empty = True
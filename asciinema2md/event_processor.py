@@ -2,7 +2,18 @@
 
 import re
 from typing import List, Tuple, Optional
-from .ansi import strip_ansi
+from .ansi import maybe_strip_ansi, printable_ascii
+from ._cleaning import clean_output
+from .detector import prompt_hit
+
+# Compiled once at import so the per-line/per-event loops below skip the
+# re module's cache lookup on every call
+_COMPLETE_CMD_RE = re.compile(r'^[a-zA-Z][a-zA-Z0-9_/\-\.\s\$"\'=:;]+$')
+
+# Everything except printable ASCII and backspace, deleted in one
+# bytes.translate pass before the keystroke loop runs
+_TYPED_DELETE = bytes(c for c in range(128)
+                      if c != 0x08 and not 0x20 <= c <= 0x7E)
 
 
 class EventProcessor:
@@ -11,20 +22,29 @@ class EventProcessor:
     def __init__(self):
         self.prompt_pattern = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*')
         self.commands: List[Tuple[str, str]] = []  # (command, output)
-        self.current_command_buffer = []  # Characters being typed
+        self.current_command_buffer = bytearray()  # ASCII bytes being typed
         self.current_output = []
         self.in_prompt = False
         self.command_entered = False
         
-    def process_events(self, events: List[Tuple[float, str, str]]) -> List[Tuple[str, str]]:
-        """Process all events and return list of (command, output) tuples."""
+    def process_events(self, events: List[Tuple[float, str, str]],
+                       prompt_hits: Optional[List[bool]] = None) -> List[Tuple[str, str]]:
+        """Process all events and return list of (command, output) tuples.
+
+        Args:
+            events: Event list from parse_cast_file
+            prompt_hits: Optional per-event prompt flags from
+                parser.precompute_prompt_hits, shared across extractors
+                to avoid re-running the prompt regex here
+        """
         
-        for timestamp, event_type, text in events:
+        for i, (timestamp, event_type, text) in enumerate(events):
             if event_type != 'o':
                 continue
             
             # Check for prompt
-            if self.prompt_pattern.search(text):
+            if (prompt_hits[i] if prompt_hits is not None
+                    else prompt_hit(text)):
                 # New prompt detected
                 if self.command_entered:
                     # Save previous command
@@ -35,13 +55,13 @@ class EventProcessor:
                         self.commands.append((cmd, output))
                 
                 # Reset for new command
-                self.current_command_buffer = []
+                self.current_command_buffer = bytearray()
                 self.current_output = []
                 self.in_prompt = True
                 self.command_entered = False
                 continue
             
-            clean_text = strip_ansi(text)
+            clean_text = maybe_strip_ansi(text)
             
             if self.in_prompt and not self.command_entered:
                 # We're in a prompt, tracking command input
@@ -58,24 +78,30 @@ class EventProcessor:
                 # Complete commands usually appear as one string without control chars
                 if (len(clean_text) > 5 and 
                     not any(c in clean_text for c in '\x1b\r\n\b') and
-                    re.search(r'^[a-zA-Z][a-zA-Z0-9_/\-\.\s\$"\'=:;]+$', clean_text.strip())):
+                    _COMPLETE_CMD_RE.match(clean_text.strip())):
                     # This looks like a complete command
-                    self.current_command_buffer = [clean_text.strip()]
+                    self.current_command_buffer = bytearray(
+                        clean_text.strip().encode('ascii', 'ignore'))
                     self.command_entered = True
                     self.in_prompt = False
                     continue
                 
-                # Track individual characters (handle backspaces)
-                for char in text:
-                    if char == '\b':
-                        # Backspace - remove last character
-                        if self.current_command_buffer:
-                            self.current_command_buffer.pop()
-                    elif char not in '\x1b\r\n':
-                        # Regular character (skip ANSI start, but we already stripped)
-                        # Only add printable characters
-                        if 32 <= ord(char) <= 126:  # Printable ASCII
-                            self.current_command_buffer.append(char)
+                # Track individual characters (handle backspaces).
+                # Filtering down to printable ASCII + backspace first runs
+                # in the codec/translate C loops, so the Python loop only
+                # ever sees characters it will keep or fold.
+                typed = (text.encode('ascii', 'ignore')
+                             .translate(None, _TYPED_DELETE))
+                if 0x08 not in typed:
+                    self.current_command_buffer += typed
+                else:
+                    for byte in typed:
+                        if byte == 0x08:
+                            # Backspace - remove last character
+                            if self.current_command_buffer:
+                                del self.current_command_buffer[-1]
+                        else:
+                            self.current_command_buffer.append(byte)
             else:
                 # This is output
                 if clean_text.strip() and not clean_text.startswith('┌──'):
@@ -93,32 +119,11 @@ class EventProcessor:
     
     def _extract_command(self) -> str:
         """Extract final command from buffer."""
-        cmd = ''.join(self.current_command_buffer).strip()
+        cmd = self.current_command_buffer.decode('ascii').strip()
         # Remove any remaining ANSI artifacts
-        cmd = re.sub(r'[^\x20-\x7E]', '', cmd)
+        cmd = printable_ascii(cmd)
         return cmd.strip()
     
     def _clean_output(self, text: str) -> str:
         """Clean output text."""
-        lines = text.split('\n')
-        cleaned = []
-        for line in lines:
-            # Remove vim artifacts
-            if line.strip() == '~':
-                continue
-            if '-- INSERT --' in line or '-- REPLACE --' in line:
-                continue
-            if re.match(r'^\d+,\d+.*All', line):
-                continue
-            if line.strip() in ['▽', 'zz']:
-                continue
-            cleaned.append(line)
-        
-        # Remove leading/trailing empty lines
-        while cleaned and not cleaned[0].strip():
-            cleaned.pop(0)
-        while cleaned and not cleaned[-1].strip():
-            cleaned.pop()
-        
-        return '\n'.join(cleaned)
-
+        return clean_output(text)
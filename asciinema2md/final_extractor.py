@@ -1,9 +1,17 @@
 """Final improved extractor that tracks commands properly."""
 
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from .terminal import Terminal
-from .ansi import strip_ansi
+from .ansi import contains_enter, maybe_strip_ansi, printable_ascii
+from ._cleaning import clean_output
+from .detector import prompt_hit
+
+# Hoisted out of the hot loops; matching on the compiled objects avoids a
+# cache lookup per line
+
+# Command text follows the prompt tail on the '└─' line
+_PROMPT_TAIL_RE = re.compile(r'└─[#\$]\s*(.+)$')
 
 
 class FinalExtractor:
@@ -20,15 +28,27 @@ class FinalExtractor:
         self.last_prompt_idx = -1
         self.snapshots: List[Tuple[int, str, float]] = []
         
-    def process_events(self, events: List[Tuple[float, str, str]]) -> List[Tuple[str, str]]:
-        """Process events and extract commands."""
+    def process_events(self, events: List[Tuple[float, str, str]],
+                       prompt_hits: Optional[List[bool]] = None) -> List[Tuple[str, str]]:
+        """Process events and extract commands.
+
+        Args:
+            events: Event list from parse_cast_file
+            prompt_hits: Optional per-event prompt flags from
+                parser.precompute_prompt_hits, shared across extractors
+                to avoid re-running the prompt regex here
+        """
         
         for i, (timestamp, event_type, text) in enumerate(events):
             if event_type != 'o':
                 continue
             
             # Check for prompt
-            if self.prompt_pattern.search(text):
+            if prompt_hits is not None:
+                had_prompt = prompt_hits[i]
+            else:
+                had_prompt = prompt_hit(text) is not None
+            if had_prompt:
                 # Save previous command if we have one
                 if self.current_command_line:
                     cmd = self.current_command_line.strip()
@@ -47,31 +67,34 @@ class FinalExtractor:
             # Process through terminal
             self.terminal.process_text(text)
             
-            # Track command being typed (extract from terminal state)
-            # Get current line that has the prompt
-            current_output = self.terminal.get_output()
-            current_clean = strip_ansi(current_output)
-            lines = current_clean.split('\n')
-            
-            # Find the line with the current prompt
-            for line in reversed(lines[-5:]):  # Check last few lines
-                if self.prompt_pattern.search(line):
-                    # Extract command from this line
-                    match = re.search(r'└─[#\$]\s*(.+)$', line)
-                    if match:
-                        potential_cmd = match.group(1).strip()
-                        # Only update if it's longer (user is typing)
-                        if len(potential_cmd) > len(self.current_command_line):
-                            # Filter out autocomplete (gray text appears but isn't part of actual command yet)
-                            # The actual command is what's on the line after prompt
-                            self.current_command_line = potential_cmd
+            # Track command being typed (extract from terminal state).
+            # Re-materializing and stripping the whole screen costs
+            # O(width x height); only the events that redraw the prompt line
+            # can change what this scan finds, so plain keystrokes skip it.
+            if had_prompt or '└─' in text:
+                current_output = self.terminal.get_output()
+                current_clean = maybe_strip_ansi(current_output)
+                lines = current_clean.split('\n')
+
+                # Find the line with the current prompt
+                for line in reversed(lines[-5:]):  # Check last few lines
+                    if prompt_hit(line):
+                        # Extract command from this line
+                        match = _PROMPT_TAIL_RE.search(line)
+                        if match:
+                            potential_cmd = match.group(1).strip()
+                            # Only update if it's longer (user is typing)
+                            if len(potential_cmd) > len(self.current_command_line):
+                                # Filter out autocomplete (gray text appears but isn't part of actual command yet)
+                                # The actual command is what's on the line after prompt
+                                self.current_command_line = potential_cmd
             
             # Check if Enter was pressed
-            if '\r\r\n' in text or '\u001b[1B\r' in text:
+            if contains_enter(text):
                 # Command entered - finalize it
                 if self.current_command_line:
                     cmd = self.current_command_line.strip()
-                    cmd = re.sub(r'[^\x20-\x7E]', '', cmd)
+                    cmd = printable_ascii(cmd)
                     if cmd:
                         output = self._get_output_for_command(i)
                         self.commands.append((cmd, output, self.last_prompt_time))
@@ -80,13 +103,13 @@ class FinalExtractor:
         # Don't forget last command
         if self.current_command_line:
             cmd = self.current_command_line.strip()
-            cmd = re.sub(r'[^\x20-\x7E]', '', cmd)
+            cmd = printable_ascii(cmd)
             if cmd:
                 output = self._get_output_for_command(len(events))
                 self.commands.append((cmd, output, self.last_prompt_time))
         
         # Also extract from final terminal state
-        final_output = strip_ansi(self.terminal.get_output())
+        final_output = maybe_strip_ansi(self.terminal.get_output())
         final_commands = self._extract_from_output(final_output)
         
         # Merge commands
@@ -95,11 +118,10 @@ class FinalExtractor:
             if cmd not in commands_dict:
                 commands_dict[cmd] = (cmd, output)
         
-        # Sort and return
-        result = list(commands_dict.values())
-        result.sort(key=lambda x: x[0])  # Sort by command for now
-        
-        return result
+        # commands_dict was filled in event order, which is the order the
+        # transcript ran in; sorting by command text reshuffled it for no
+        # benefit, so insertion order is returned as-is
+        return list(commands_dict.values())
     
     def _extract_from_output(self, output: str) -> List[Tuple[str, str]]:
         """Extract commands from terminal output."""
@@ -109,12 +131,12 @@ class FinalExtractor:
         i = 0
         while i < len(lines):
             line = lines[i]
-            if self.prompt_pattern.search(line):
+            if prompt_hit(line):
                 # Extract command
-                match = re.search(r'└─[#\$]\s*(.+)$', line)
+                match = _PROMPT_TAIL_RE.search(line)
                 if match:
                     cmd = match.group(1).strip()
-                    cmd = re.sub(r'[^\x20-\x7E]', '', cmd)
+                    cmd = printable_ascii(cmd)
                     
                     if (cmd and len(cmd) >= 2 and cmd[0].isalpha() and
                         (len(cmd) > 10 or ' ' in cmd or cmd in ['cd', 'ls', 'cp', 'mv', 'rm', 'cat', 'vim', 'nano', 'exit', 'pwd', 'mkdir'])):
@@ -123,7 +145,7 @@ class FinalExtractor:
                         output_lines = []
                         j = i + 1
                         while j < len(lines):
-                            if self.prompt_pattern.search(lines[j]):
+                            if prompt_hit(lines[j]):
                                 break
                             output_lines.append(lines[j])
                             j += 1
@@ -143,23 +165,5 @@ class FinalExtractor:
     
     def _clean_output(self, text: str) -> str:
         """Clean output text."""
-        lines = text.split('\n')
-        cleaned = []
-        for line in lines:
-            if line.strip() == '~':
-                continue
-            if '-- INSERT --' in line:
-                continue
-            if re.match(r'^\d+,\d+.*All', line):
-                continue
-            if len(line.strip()) <= 2 and line.strip().isalpha():
-                continue
-            cleaned.append(line)
-        
-        while cleaned and not cleaned[0].strip():
-            cleaned.pop(0)
-        while cleaned and not cleaned[-1].strip():
-            cleaned.pop()
-        
-        return '\n'.join(cleaned)
-
+        return clean_output(text, replace=False, vim_marks=False,
+                            short_alpha=True)
@@ -1,64 +1,65 @@
 """Format terminal session as Markdown."""
 
+import re
 from typing import List, Tuple, Optional
 
+_BACKTICK_RUN_RE = re.compile(r'`+')
 
-def format_as_markdown(commands_and_output: List[Tuple[Optional[str], str]], 
+
+def _fence_for(output: str) -> str:
+    """
+    Pick a code-fence long enough to contain output safely.
+
+    An output that itself contains a run of backticks would terminate a
+    plain ``` fence early; the fence must be longer than the longest run.
+    """
+    longest = max((len(run) for run in _BACKTICK_RUN_RE.findall(output)),
+                  default=0)
+    return '`' * max(longest + 1, 3)
+
+
+def format_as_markdown(commands_and_output: List[Tuple[Optional[str], str]],
                       metadata: dict = None) -> str:
     """
     Format commands and output as Markdown.
-    
+
     Args:
         commands_and_output: List of (command, output) tuples
         metadata: Optional metadata dict from cast file
-        
+
     Returns:
         Markdown formatted string
     """
-    lines = []
-    
+    # One string per block, joined once at the end; cheaper than growing a
+    # per-line list and also keeps each block's layout in one place
+    blocks = []
+
     # Add header
-    lines.append("# Terminal Session")
-    lines.append("")
-    
+    blocks.append("# Terminal Session")
+
     if metadata:
         # Add metadata as a note
-        lines.append("<!--")
-        lines.append(f"Recorded: {metadata.get('timestamp', 'unknown')}")
-        lines.append(f"Terminal: {metadata.get('width', '?')}x{metadata.get('height', '?')}")
+        note = ["<!--"]
+        note.append(f"Recorded: {metadata.get('timestamp', 'unknown')}")
+        note.append(f"Terminal: {metadata.get('width', '?')}x{metadata.get('height', '?')}")
         if 'env' in metadata:
-            lines.append(f"Shell: {metadata['env'].get('SHELL', 'unknown')}")
-        lines.append("-->")
-        lines.append("")
-    
+            note.append(f"Shell: {metadata['env'].get('SHELL', 'unknown')}")
+        note.append("-->")
+        blocks.append('\n'.join(note))
+
     # Format each command/output pair
-    for i, (command, output) in enumerate(commands_and_output):
+    for command, output in commands_and_output:
         if command:
             # This is a command
-            lines.append(f"## Command: {command}")
-            lines.append("")
-            lines.append("```bash")
-            lines.append(command)
-            lines.append("```")
-            lines.append("")
-            
+            blocks.append(f"## Command: {command}\n\n```bash\n{command}\n```")
+
             if output:
-                lines.append("### Output")
-                lines.append("")
-                # Output in code block
-                lines.append("```")
-                lines.append(output)
-                lines.append("```")
-                lines.append("")
+                fence = _fence_for(output)
+                blocks.append(f"### Output\n\n{fence}\n{output}\n{fence}")
         else:
             # Pure output (no command)
             if output:
-                lines.append("## Output")
-                lines.append("")
-                lines.append("```")
-                lines.append(output)
-                lines.append("```")
-                lines.append("")
-    
-    return '\n'.join(lines)
+                fence = _fence_for(output)
+                blocks.append(f"## Output\n\n{fence}\n{output}\n{fence}")
 
+    return '\n\n'.join(blocks) + '\n'
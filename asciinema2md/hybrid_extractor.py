@@ -1,9 +1,18 @@
 """Hybrid approach: terminal emulator + event tracking."""
 
 import re
-from typing import List, Tuple
-from .terminal import Terminal
-from .ansi import strip_ansi
+from typing import List, Optional, Tuple
+from .terminal import Terminal, replay_with_snapshots
+from .ansi import maybe_strip_ansi
+from ._cleaning import clean_output
+from .detector import prompt_hit
+
+# Hoisted out of the hot loops; matching on the compiled objects avoids a
+# cache lookup per line
+_NONPRINTABLE_RE = re.compile(r'[^\x20-\x7E]')
+
+# Command text follows the prompt tail on the '└─' line
+_PROMPT_TAIL_RE = re.compile(r'└─[#\$]\s*(.+)$')
 
 
 class HybridExtractor:
@@ -18,34 +27,22 @@ class HybridExtractor:
         self.last_prompt_pos = -1
         self.snapshots: List[Tuple[int, str]] = []  # (event_index, terminal_state)
         
-    def process_events(self, events: List[Tuple[float, str, str]]) -> List[Tuple[str, str]]:
-        """Process events and extract commands."""
-        
-        for i, (timestamp, event_type, text) in enumerate(events):
-            if event_type != 'o':
-                continue
-            
-            # Check for prompt
-            if self.prompt_pattern.search(text):
-                # Take snapshot before processing this prompt
-                if i > 0:
-                    snapshot = self.terminal.get_output()
-                    self.snapshots.append((i, snapshot))
-                
-                self.last_prompt_pos = i
-            
-            # Process through terminal
-            self.terminal.process_text(text)
-            
-            # Check if Enter was pressed (look for \r\r\n or cursor down + \r)
-            if '\r\r\n' in text or '\u001b[1B\r' in text:
-                # Take snapshot to capture command
-                snapshot = self.terminal.get_output()
-                self.snapshots.append((i, snapshot))
+    def process_events(self, events: List[Tuple[float, str, str]],
+                       prompt_hits: Optional[List[bool]] = None) -> List[Tuple[str, str]]:
+        """Process events and extract commands.
+
+        Args:
+            events: Event list from parse_cast_file
+            prompt_hits: Optional per-event prompt flags from
+                parser.precompute_prompt_hits, shared across extractors
+                to avoid re-running the prompt regex here
+        """
         
-        # Final snapshot
-        final_snapshot = self.terminal.get_output()
-        self.snapshots.append((len(events), final_snapshot))
+        # One shared replay pass builds the snapshot list; timestamps are
+        # dropped since this extractor has never kept them
+        snapshots, self.last_prompt_pos = replay_with_snapshots(
+            self.terminal, events, prompt_hits)
+        self.snapshots = [(idx, snapshot) for idx, snapshot, _ in snapshots]
         
         # Extract commands from snapshots
         return self._extract_commands()
@@ -56,7 +53,7 @@ class HybridExtractor:
         
         # Process final terminal state
         final_output = self.terminal.get_output()
-        final_output = strip_ansi(final_output)
+        final_output = maybe_strip_ansi(final_output)
         
         # Extract all commands from final output
         lines = final_output.split('\n')
@@ -66,24 +63,24 @@ class HybridExtractor:
             line = lines[i]
             
             # Look for prompt
-            if self.prompt_pattern.search(line):
+            if prompt_hit(line):
                 # Extract command from next line or same line
                 cmd = None
                 
                 # Check if command is on same line
-                match = re.search(r'└─[#\$]\s*(.+)$', line)
+                match = _PROMPT_TAIL_RE.search(line)
                 if match:
                     cmd = match.group(1).strip()
                 elif i + 1 < len(lines):
                     # Command might be on next line
                     next_line = lines[i + 1]
                     # Check if it's a command (not another prompt)
-                    if not self.prompt_pattern.search(next_line):
+                    if not prompt_hit(next_line):
                         cmd = next_line.strip()
                 
                 if cmd:
                     # Clean command
-                    cmd = re.sub(r'[^\x20-\x7E]', '', cmd)
+                    cmd = _NONPRINTABLE_RE.sub('', cmd)
                     cmd = cmd.strip()
                     
                     if cmd and len(cmd) < 500:
@@ -92,7 +89,7 @@ class HybridExtractor:
                         start_idx = i + 2 if match else i + 1
                         j = start_idx
                         while j < len(lines):
-                            if self.prompt_pattern.search(lines[j]):
+                            if prompt_hit(lines[j]):
                                 break
                             output_lines.append(lines[j])
                             j += 1
@@ -109,25 +106,4 @@ class HybridExtractor:
     
     def _clean_output(self, text: str) -> str:
         """Clean output text."""
-        lines = text.split('\n')
-        cleaned = []
-        for line in lines:
-            if line.strip() == '~':
-                continue
-            if '-- INSERT --' in line or '-- REPLACE --' in line:
-                continue
-            if re.match(r'^\d+,\d+.*All', line):
-                continue
-            if line.strip() in ['▽', 'zz']:
-                continue
-            if re.match(r'^".*"\s+\d+L,\s+\d+B', line):
-                continue
-            cleaned.append(line)
-        
-        while cleaned and not cleaned[0].strip():
-            cleaned.pop(0)
-        while cleaned and not cleaned[-1].strip():
-            cleaned.pop()
-        
-        return '\n'.join(cleaned)
-
+        return clean_output(text, fileinfo=True)
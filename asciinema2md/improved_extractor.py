@@ -1,9 +1,19 @@
 """Improved command extraction using terminal emulator snapshots."""
 
 import re
+from operator import itemgetter
 from typing import List, Tuple, Optional
-from .terminal import Terminal
-from .ansi import strip_ansi
+from .terminal import Terminal, replay_with_snapshots
+from .ansi import maybe_strip_ansi
+from ._cleaning import clean_output
+from .detector import prompt_hit
+
+# Hoisted out of the hot loops; matching on the compiled objects avoids a
+# cache lookup per line
+_NONPRINTABLE_RE = re.compile(r'[^\x20-\x7E]')
+
+# Command text follows the prompt tail on the '└─' line
+_PROMPT_TAIL_RE = re.compile(r'└─[#\$]\s*(.+)$')
 
 
 class ImprovedExtractor:
@@ -18,33 +28,20 @@ class ImprovedExtractor:
         self.last_prompt_idx = -1
         self.command_snapshots: List[Tuple[int, str, float]] = []  # (event_idx, terminal_state, timestamp)
         
-    def process_events(self, events: List[Tuple[float, str, str]]) -> List[Tuple[str, str]]:
-        """Process events and extract commands."""
-        
-        for i, (timestamp, event_type, text) in enumerate(events):
-            if event_type != 'o':
-                continue
-            
-            # Check for prompt
-            if self.prompt_pattern.search(text):
-                # Take snapshot before processing this prompt
-                if i > 0:
-                    snapshot = self.terminal.get_output()
-                    self.command_snapshots.append((i, snapshot, timestamp))
-                self.last_prompt_idx = i
-            
-            # Process through terminal
-            self.terminal.process_text(text)
-            
-            # Check if Enter was pressed
-            if '\r\r\n' in text or (i > 0 and '\u001b[1B\r' in text):
-                # Take snapshot to capture command
-                snapshot = self.terminal.get_output()
-                self.command_snapshots.append((i, snapshot, timestamp))
+    def process_events(self, events: List[Tuple[float, str, str]],
+                       prompt_hits: Optional[List[bool]] = None) -> List[Tuple[str, str]]:
+        """Process events and extract commands.
+
+        Args:
+            events: Event list from parse_cast_file
+            prompt_hits: Optional per-event prompt flags from
+                parser.precompute_prompt_hits, shared across extractors
+                to avoid re-running the prompt regex here
+        """
         
-        # Final snapshot
-        final_snapshot = self.terminal.get_output()
-        self.command_snapshots.append((len(events), final_snapshot, events[-1][0] if events else 0.0))
+        # One shared replay pass builds the snapshot list
+        self.command_snapshots, self.last_prompt_idx = replay_with_snapshots(
+            self.terminal, events, prompt_hits)
         
         # Extract commands from snapshots
         return self._extract_commands_from_snapshots()
@@ -52,32 +49,38 @@ class ImprovedExtractor:
     def _extract_commands_from_snapshots(self) -> List[Tuple[str, str]]:
         """Extract commands by analyzing terminal snapshots."""
         commands = []
-        
+        seen = set()  # commands already collected, for O(1) duplicate checks
+
+        # Strip and split every snapshot once up front; the output search
+        # below peeks into the following snapshot, so without this pre-pass
+        # each snapshot would be re-cleaned once per command found in it
+        snapshot_lines = [maybe_strip_ansi(snapshot).split('\n')
+                          for _, snapshot, _ in self.command_snapshots]
+
         # Process each snapshot to find commands
         for i, (snapshot_idx, snapshot, timestamp) in enumerate(self.command_snapshots):
-            snapshot_clean = strip_ansi(snapshot)
-            lines = snapshot_clean.split('\n')
-            
+            lines = snapshot_lines[i]
+
             # Look for prompts and extract commands
             for line_idx, line in enumerate(lines):
-                if self.prompt_pattern.search(line):
+                if prompt_hit(line):
                     # Found a prompt, look for command
                     # Command is usually on the same line after the prompt, or next line
                     cmd = None
                     
                     # Try to extract from same line
-                    match = re.search(r'└─[#\$]\s*(.+)$', line)
+                    match = _PROMPT_TAIL_RE.search(line)
                     if match:
                         cmd = match.group(1).strip()
                     elif line_idx + 1 < len(lines):
                         # Check next line
                         next_line = lines[line_idx + 1]
-                        if not self.prompt_pattern.search(next_line):
+                        if not prompt_hit(next_line):
                             cmd = next_line.strip()
                     
                     if cmd:
                         # Clean command
-                        cmd = re.sub(r'[^\x20-\x7E]', '', cmd)
+                        cmd = _NONPRINTABLE_RE.sub('', cmd)
                         cmd = cmd.strip()
                         
                         # Filter valid commands
@@ -88,36 +91,37 @@ class ImprovedExtractor:
                             cmd[0].isalpha() and
                             (len(cmd) > 10 or ' ' in cmd or cmd in ['cd', 'ls', 'cp', 'mv', 'rm', 'cat', 'vim', 'nano', 'exit', 'pwd'])):
                             
-                            # Find output (until next prompt in this or next snapshot)
-                            output = self._find_output_for_command(snapshot_idx, line_idx, lines, i)
-                            
                             # Check if we already have this command
-                            if not any(c == cmd for c, _, _ in commands):
+                            if cmd not in seen:
+                                seen.add(cmd)
+                                # Find output (until next prompt in this or next snapshot)
+                                output = self._find_output_for_command(
+                                    snapshot_idx, line_idx, snapshot_lines, i)
                                 commands.append((cmd, output, timestamp))
         
         # Sort by timestamp
-        commands.sort(key=lambda x: x[2])
+        commands.sort(key=itemgetter(2))
         return [(cmd, output) for cmd, output, _ in commands]
     
-    def _find_output_for_command(self, snapshot_idx: int, line_idx: int, lines: List[str], snapshot_num: int) -> str:
-        """Find output for a command."""
+    def _find_output_for_command(self, snapshot_idx: int, line_idx: int,
+                                 snapshot_lines: List[List[str]], snapshot_num: int) -> str:
+        """Find output for a command, given the pre-cleaned snapshot lines."""
         output_lines = []
-        
+        lines = snapshot_lines[snapshot_num]
+
         # Look in current snapshot
         start_idx = line_idx + 2  # Skip prompt line and command line
         for i in range(start_idx, len(lines)):
-            if self.prompt_pattern.search(lines[i]):
+            if prompt_hit(lines[i]):
                 break
             output_lines.append(lines[i])
-        
+
         # Also check next snapshot if available
-        if snapshot_num + 1 < len(self.command_snapshots):
-            next_snapshot = self.command_snapshots[snapshot_num + 1][1]
-            next_clean = strip_ansi(next_snapshot)
-            next_lines = next_clean.split('\n')
-            
+        if snapshot_num + 1 < len(snapshot_lines):
+            next_lines = snapshot_lines[snapshot_num + 1]
+
             for line in next_lines:
-                if self.prompt_pattern.search(line):
+                if prompt_hit(line):
                     break
                 output_lines.append(line)
         
@@ -125,35 +129,5 @@ class ImprovedExtractor:
     
     def _clean_output(self, text: str) -> str:
         """Clean output text."""
-        lines = text.split('\n')
-        cleaned = []
-        
-        for line in lines:
-            if line.strip() == '~':
-                continue
-            if '-- INSERT --' in line or '-- REPLACE --' in line:
-                continue
-            if re.match(r'^\d+,\d+.*All', line):
-                continue
-            if line.strip() in ['▽', 'zz']:
-                continue
-            if re.match(r'^".*"\s+\d+L,\s+\d+B', line):
-                continue
-            if re.match(r'^\d+,\d+.*written', line):
-                continue
-            if len(line.strip()) <= 2 and line.strip().isalpha():
-                # Skip very short lines that are likely typing artifacts
-                continue
-            if line.strip().startswith('[') and ('?25' in line or '?1' in line):
-                continue
-            
-            cleaned.append(line)
-        
-        # Remove leading/trailing empty lines
-        while cleaned and not cleaned[0].strip():
-            cleaned.pop(0)
-        while cleaned and not cleaned[-1].strip():
-            cleaned.pop()
-        
-        return '\n'.join(cleaned)
-
+        return clean_output(text, fileinfo=True, written=True,
+                            short_alpha=True, esc_bracket=True)
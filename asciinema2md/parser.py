@@ -1,45 +1,119 @@
 """Parse asciinema cast files."""
 
-import json
-from typing import Dict, List, Tuple, Optional
+import re
+from typing import Dict, Iterator, List, Tuple, Optional
+
+# orjson parses event lines several times faster than the stdlib; fall back
+# silently since it is an optional speedup, not a requirement
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+
+def _read_metadata_line(f) -> Dict:
+    """Read and parse the metadata header from an open binary cast file."""
+    first_line = f.readline()
+    if first_line.strip():
+        return _json.loads(first_line)
+    return {}
+
+
+def _iter_events(f) -> Iterator[Tuple[float, str, str]]:
+    """Yield (timestamp, event_type, text) tuples from an open binary file."""
+    for line in f:
+        if not line or line == b'\n':
+            continue
+
+        try:
+            event = _json.loads(line)
+            if len(event) >= 3:
+                timestamp = event[0]
+                event_type = event[1]
+                text = event[2]
+                yield (timestamp, event_type, text)
+        except ValueError:
+            # Skip malformed lines (covers json and orjson errors alike)
+            continue
 
 
 def parse_cast_file(filepath: str) -> Tuple[Dict, List[Tuple[float, str, str]]]:
     """
     Parse an asciinema cast file.
-    
+
     Args:
         filepath: Path to the .cast file
-        
+
     Returns:
         Tuple of (metadata_dict, events_list)
         Events are tuples of (timestamp, event_type, text)
     """
-    metadata = {}
-    events = []
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        # First line is metadata
-        first_line = f.readline().strip()
-        if first_line:
-            metadata = json.loads(first_line)
-        
-        # Remaining lines are events
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            
-            try:
-                event = json.loads(line)
-                if len(event) >= 3:
-                    timestamp = event[0]
-                    event_type = event[1]
-                    text = event[2]
-                    events.append((timestamp, event_type, text))
-            except json.JSONDecodeError:
-                # Skip malformed lines
-                continue
-    
+    # Binary mode skips the utf-8 text-wrapper layer; both json and orjson
+    # decode bytes directly and accept a trailing newline, so no per-line
+    # strip() copy is needed either. Large buffer keeps multi-MB casts from
+    # paying a read() per line.
+    with open(filepath, 'rb', buffering=1 << 20) as f:
+        # First line is metadata, the rest are events
+        metadata = _read_metadata_line(f)
+        events = list(_iter_events(f))
+
     return metadata, events
 
+
+def parse_cast_metadata(filepath: str) -> Dict:
+    """
+    Read only the metadata header of a cast file.
+
+    Args:
+        filepath: Path to the .cast file
+
+    Returns:
+        Metadata dict from the first line (empty dict if missing)
+    """
+    with open(filepath, 'rb') as f:
+        return _read_metadata_line(f)
+
+
+def iter_cast_events(filepath: str) -> Iterator[Tuple[float, str, str]]:
+    """
+    Stream events from a cast file without materializing the whole list.
+
+    Extractors that only make a single forward pass can consume this
+    directly, keeping peak memory at one event regardless of cast size.
+
+    Args:
+        filepath: Path to the .cast file
+
+    Yields:
+        (timestamp, event_type, text) tuples, skipping the metadata line
+    """
+    with open(filepath, 'rb', buffering=1 << 20) as f:
+        f.readline()  # metadata line
+        yield from _iter_events(f)
+
+
+# Same Kali/zsh prompt pattern the extractors use, with its leading literal
+# as a cheap pretest; kept here so prompt hits can be computed once per cast
+_PROMPT_LITERAL = '┌──('
+_PROMPT_RE = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*')
+
+
+def precompute_prompt_hits(events: List[Tuple[float, str, str]]) -> List[bool]:
+    """
+    Compute which events contain a shell prompt, once for all extractors.
+
+    Each extractor runs the same prompt regex over every 'o' event; when
+    several extractors process one cast, that work is repeated per
+    extractor. This scans the events a single time (literal substring
+    pretest first) so the result can be shared.
+
+    Args:
+        events: Event list as returned by parse_cast_file
+
+    Returns:
+        List of booleans, parallel to events: True where the event text
+        contains a prompt
+    """
+    return [event_type == 'o' and _PROMPT_LITERAL in text
+            and _PROMPT_RE.search(text) is not None
+            for _, event_type, text in events]
@@ -3,7 +3,45 @@
 import re
 from typing import List, Tuple
 from .terminal import Terminal
-from .ansi import strip_ansi
+from .ansi import contains_enter
+from .detector import prompt_hit
+
+# Every pattern used in the per-line loops below, compiled once at import
+# so instance construction and the loops skip the re module's cache lookup
+_PROMPT_RE = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*')
+_PROMPT_TAIL_RE = re.compile(r'└─[#\$]\s*(.+)$')
+_NONPRINTABLE_RE = re.compile(r'[^\x20-\x7E]')
+
+# Quick reject for the event loop: a prompt match needs the '└─' marker
+# and both Enter signatures contain '\r', so an event with neither
+# character can skip detection entirely
+_HAS_TRIGGER_RE = re.compile(r'[\r└]')
+
+# The stateless per-line reject tests in _clean_output, fused into two
+# anchored alternations so each line is walked once in C instead of once
+# per filter. Split in two because the stateful progressive-typing check
+# has to run between the vim filters and the noise filters to keep
+# prev_line tracking identical.
+_REJECT_VIM_RE = re.compile(
+    r'\s*~\s*$'                       # lone vim tilde
+    r'|.*-- (?:INSERT|REPLACE) --'      # mode indicators
+    r'|\d+,\d+.*(?:All|written)'      # position / written status lines
+    r'|\s*(?:▽|zz)\s*$'               # stray redraw marks
+    r'|".*"\s+\d+L,\s+\d+B')        # file info line
+_REJECT_NOISE_RE = re.compile(
+    r'(?=.*Completing)(?=.*executable file)'   # autocomplete banner
+    r'|\s*\[.*\?(?:25|1|2004)'              # leftover escape fragments
+    r'|\s*\[.*\]\s*$'                      # fully bracketed line
+    r'|\s*E(?:486|387)'                       # vim error codes
+    r'|\s*\d+\s*$')                         # bare number
+
+# Two-letter outputs worth keeping despite the short-line filter
+_SHORT_KEEPERS = frozenset(('ok', 'no', 'yes', 'id', 'ip'))
+
+# Short commands accepted without the length/space heuristics; built once
+# instead of a fresh list per prompt
+_ALWAYS_OK = frozenset(
+    ('cd', 'ls', 'cp', 'mv', 'rm', 'cat', 'vim', 'nano', 'exit', 'pwd', 'mkdir'))
 
 
 class SmartExtractor:
@@ -11,8 +49,16 @@ class SmartExtractor:
     
     def __init__(self, width: int, height: int):
         self.terminal = Terminal(width, height)
-        self.prompt_pattern = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*')
+        self.prompt_pattern = _PROMPT_RE
         self.commands: List[Tuple[str, str, float]] = []
+        # Stripped screen lines cached against the terminal's state version,
+        # so back-to-back extractions with no intervening output (prompt
+        # immediately after Enter, end-of-stream) reuse the same split
+        self._cached_seq = -1
+        self._cached_lines: List[str] = []
+        # Command strings already in self.commands; set membership replaces
+        # the linear scan over the list on every duplicate check
+        self._seen_cmds: set = set()
         
     def process_events(self, events: List[Tuple[float, str, str]]) -> List[Tuple[str, str]]:
         """Process events and extract commands."""
@@ -23,14 +69,23 @@ class SmartExtractor:
         for i, (timestamp, event_type, text) in enumerate(events):
             if event_type != 'o':
                 continue
-            
-            # Check for prompt
-            if self.prompt_pattern.search(text):
+
+            # Most events are keystroke echoes and plain output with no
+            # prompt or Enter in them; one character-class scan sends
+            # those straight to the terminal
+            if _HAS_TRIGGER_RE.search(text) is None:
+                self.terminal.process_text(text)
+                continue
+
+            # Check for prompt; the literal prefilter in prompt_hit means
+            # the regex never runs on the typical prompt-free event
+            if prompt_hit(text):
                 # Extract command from terminal state before this new prompt
                 if i > 0 and last_prompt_idx >= 0:
                     cmd, output = self._extract_command_from_terminal(last_prompt_idx, i)
                     if cmd:
                         self.commands.append((cmd, output, last_prompt_time))
+                        self._seen_cmds.add(cmd)
                 
                 last_prompt_time = timestamp
                 last_prompt_idx = i
@@ -39,20 +94,22 @@ class SmartExtractor:
             self.terminal.process_text(text)
             
             # Check if Enter was pressed
-            if '\r\r\n' in text or '\u001b[1B\r' in text:
+            if contains_enter(text):
                 # Take snapshot to capture command
                 cmd, output = self._extract_command_from_terminal(last_prompt_idx, i)
                 if cmd:
                     # Check if we already have this command
-                    if not any(c == cmd for c, _, _ in self.commands):
+                    if cmd not in self._seen_cmds:
                         self.commands.append((cmd, output, last_prompt_time))
+                        self._seen_cmds.add(cmd)
         
         # Extract last command
         if last_prompt_idx >= 0:
             cmd, output = self._extract_command_from_terminal(last_prompt_idx, len(events))
             if cmd:
-                if not any(c == cmd for c, _, _ in self.commands):
+                if cmd not in self._seen_cmds:
                     self.commands.append((cmd, output, last_prompt_time))
+                    self._seen_cmds.add(cmd)
         
         # Sort by timestamp
         self.commands.sort(key=lambda x: x[2])
@@ -60,28 +117,35 @@ class SmartExtractor:
     
     def _extract_command_from_terminal(self, prompt_start: int, prompt_end: int) -> Tuple[str, str]:
         """Extract command from terminal state between two prompts."""
-        # Get current terminal output
-        output = self.terminal.get_output()
-        output_clean = strip_ansi(output)
-        lines = output_clean.split('\n')
+        # Get current terminal output, reusing the cached split when the
+        # terminal has not processed anything since the last extraction.
+        # The terminal consumes escape sequences and drops stray control
+        # characters as it writes (output_is_clean), so no strip_ansi pass
+        # is needed on what it hands back.
+        if self.terminal._seq != self._cached_seq:
+            self._cached_lines = self.terminal.get_output_lines()
+            self._cached_seq = self.terminal._seq
+        lines = self._cached_lines
         
-        # Find the prompt and command
+        # Find the prompt and command; the substring test rejects the
+        # typical non-prompt line without entering the regex engine
         for i, line in enumerate(lines):
-            if self.prompt_pattern.search(line):
+            if '└─' in line and self.prompt_pattern.search(line):
                 # Extract command
-                match = re.search(r'└─[#\$]\s*(.+)$', line)
+                match = _PROMPT_TAIL_RE.search(line)
                 if match:
                     cmd = match.group(1).strip()
-                    cmd = re.sub(r'[^\x20-\x7E]', '', cmd)
+                    cmd = _NONPRINTABLE_RE.sub('', cmd)
                     
-                    # Filter valid commands
-                    if (cmd and len(cmd) >= 2 and cmd[0].isalpha() and
-                        (len(cmd) > 10 or ' ' in cmd or cmd in ['cd', 'ls', 'cp', 'mv', 'rm', 'cat', 'vim', 'nano', 'exit', 'pwd', 'mkdir'])):
+                    # Filter valid commands - cheapest tests first, the
+                    # whitelist lookup last
+                    if (len(cmd) >= 2 and cmd[0].isalpha() and
+                        (len(cmd) > 10 or ' ' in cmd or cmd in _ALWAYS_OK)):
                         
                         # Find output
                         output_lines = []
                         for j in range(i + 1, len(lines)):
-                            if self.prompt_pattern.search(lines[j]):
+                            if '└─' in lines[j] and self.prompt_pattern.search(lines[j]):
                                 break
                             output_lines.append(lines[j])
                         
@@ -100,22 +164,12 @@ class SmartExtractor:
             line_stripped = line.strip()
             
             # Remove vim artifacts
-            if line_stripped == '~':
-                continue
-            if '-- INSERT --' in line or '-- REPLACE --' in line:
-                continue
-            if re.match(r'^\d+,\d+.*All', line):
-                continue
-            if line_stripped in ['▽', 'zz']:
-                continue
-            if re.match(r'^".*"\s+\d+L,\s+\d+B', line):
-                continue
-            if re.match(r'^\d+,\d+.*written', line):
+            if _REJECT_VIM_RE.match(line):
                 continue
             
             # Remove very short lines (likely typing artifacts)
             if len(line_stripped) <= 2:
-                if line_stripped.lower() not in ['ok', 'no', 'yes', 'id', 'ip']:
+                if line_stripped.lower() not in _SHORT_KEEPERS:
                     continue
             
             # Remove lines that are just single characters
@@ -127,18 +181,9 @@ class SmartExtractor:
                 prev_line = line_stripped
                 continue
             
-            # Remove autocomplete suggestion messages
-            if 'Completing' in line and 'executable file' in line:
-                continue
-            
-            # Remove ANSI escape sequences
-            if line_stripped.startswith('[') and ('?25' in line or '?1' in line or '?2004' in line):
-                continue
-            if re.match(r'^\[.*\]$', line_stripped):
-                continue
-            if line_stripped.startswith('E486') or line_stripped.startswith('E387'):
-                continue
-            if re.match(r'^\s*\d+\s*$', line_stripped):
+            # Remove autocomplete banners, escape fragments, vim error
+            # codes and bare numbers
+            if _REJECT_NOISE_RE.match(line):
                 continue
             
             # Remove lines that are just punctuation
@@ -3,7 +3,16 @@
 import re
 from typing import List, Tuple, Optional
 from .terminal import Terminal
-from .ansi import strip_ansi
+
+# Compiled once at import; the extraction loops only call methods on the
+# pattern objects
+_PROMPT_RE = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*')
+# Prompt and trailing command fused into one pattern so extraction is a
+# single scan instead of a prompt match plus a per-hit line split
+_PROMPT_CMD_RE = re.compile(
+    r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*(?P<cmd>.+?)$', re.MULTILINE)
+_NONPRINTABLE_RE = re.compile(r'[^\x20-\x7E]')
+_VIM_STATUS_RE = re.compile(r'^\d+,\d+.*All')
 
 
 class SnapshotProcessor:
@@ -11,7 +20,7 @@ class SnapshotProcessor:
     
     def __init__(self, width: int, height: int):
         self.terminal = Terminal(width, height)
-        self.prompt_pattern = re.compile(r'┌──\([^\)]+\)\-\[[^\]]+\]\r?\n└─[#\$]\s*')
+        self.prompt_pattern = _PROMPT_RE
         self.commands: List[Tuple[str, str]] = []
         self.snapshots: List[Tuple[float, str]] = []  # (timestamp, terminal_state)
         
@@ -28,8 +37,9 @@ class SnapshotProcessor:
             # Process through terminal
             self.terminal.process_text(text)
             
-            # Check for prompt
-            if self.prompt_pattern.search(text):
+            # Check for prompt; the substring test rejects the typical
+            # prompt-free event without entering the regex engine
+            if '└─' in text and self.prompt_pattern.search(text):
                 # Take snapshot before this prompt (captures previous command's final state)
                 if last_prompt_time is not None:
                     snapshot = self.terminal.get_output()
@@ -55,9 +65,9 @@ class SnapshotProcessor:
         if not self.snapshots:
             return []
         
-        # Get final terminal state
+        # Get final terminal state; the buffer is escape-free by
+        # construction (output_is_clean), so it can be scanned directly
         final_output = self.terminal.get_output()
-        final_output = strip_ansi(final_output)
         
         # Extract commands using pattern matching
         return self._extract_from_output(final_output)
@@ -65,44 +75,26 @@ class SnapshotProcessor:
     def _extract_from_output(self, output: str) -> List[Tuple[str, str]]:
         """Extract commands from terminal output."""
         commands = []
-        lines = output.split('\n')
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            
-            # Look for prompt
-            if self.prompt_pattern.search(line):
-                # Found prompt, next line should have command
-                if i + 1 < len(lines):
-                    next_line = lines[i + 1]
-                    # Extract command (everything after prompt end marker)
-                    match = re.search(r'└─[#\$]\s*(.+)$', next_line)
-                    if not match:
-                        # Command might be on same line
-                        match = re.search(r'└─[#\$]\s*(.+)$', line)
-                    
-                    if match:
-                        command = match.group(1).strip()
-                        command = re.sub(r'[^\x20-\x7E]', '', command)  # Clean
-                        
-                        if command and len(command) < 200:  # Reasonable length
-                            # Find output (until next prompt)
-                            output_lines = []
-                            j = i + 2
-                            while j < len(lines):
-                                if self.prompt_pattern.search(lines[j]):
-                                    break
-                                output_lines.append(lines[j])
-                                j += 1
-                            
-                            output_text = '\n'.join(output_lines)
-                            output_text = self._clean_output(output_text)
-                            
-                            commands.append((command, output_text))
-                            i = j - 1
-            i += 1
-        
+
+        # One linear finditer pass over the joined buffer yields each
+        # prompt together with its command (the fused pattern captures the
+        # rest of the prompt line), and bounds each output block with the
+        # next match's start. Matching the joined buffer also lets the
+        # two-line prompt pattern match at all, which a line-by-line
+        # search never could.
+        matches = list(_PROMPT_CMD_RE.finditer(output))
+        for k, match in enumerate(matches):
+            command = match.group('cmd').strip()
+            command = _NONPRINTABLE_RE.sub('', command)  # Clean
+
+            if command and len(command) < 200:  # Reasonable length
+                # Output runs until the next prompt
+                block_end = matches[k + 1].start() if k + 1 < len(matches) else len(output)
+                output_text = output[min(match.end() + 1, block_end):block_end]
+                output_text = self._clean_output(output_text)
+
+                commands.append((command, output_text))
+
         return commands
     
     def _clean_output(self, text: str) -> str:
@@ -112,9 +104,9 @@ class SnapshotProcessor:
         for line in lines:
             if line.strip() == '~':
                 continue
-            if '-- INSERT --' in line or '-- REPLACE --' in line:
+            if '--' in line and ('-- INSERT --' in line or '-- REPLACE --' in line):
                 continue
-            if re.match(r'^\d+,\d+.*All', line):
+            if _VIM_STATUS_RE.match(line):
                 continue
             if line.strip() in ['▽', 'zz']:
                 continue
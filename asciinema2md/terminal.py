@@ -1,7 +1,26 @@
 """Terminal state emulator to reconstruct output from events."""
 
-from typing import List
-from .ansi import strip_ansi
+import re
+from collections import deque
+from typing import List, Optional, Tuple
+from .ansi import contains_enter, strip_ansi
+from .detector import prompt_hit
+
+
+# Well-formed CSI sequence anchored right after ESC-[: numeric parameters
+# and the command letter come out of one match. Sequences carrying other
+# bytes (private modes like ?25l, malformed input) miss and take the
+# terminator scan below instead.
+_CSI_PARAM_RE = re.compile(r'([0-9;]*)([ABCDEFGHJKSTfmsu])')
+
+# First character that terminates a CSI sequence; a compiled character
+# class scan replaces the per-char Python while-loop
+_CSI_END_RE = re.compile(r'[ABCDEFGHJKSTfmsu]')
+
+# A run of printable ASCII with no escapes or control characters - the
+# bulk of typical terminal output - which can be blitted into the current
+# row in one slice assignment instead of one _write_char call per char
+_PLAIN_RUN_RE = re.compile(r'[\x20-\x7e]+')
 
 
 class Terminal:
@@ -10,51 +29,83 @@ class Terminal:
     def __init__(self, width: int = 80, height: int = 24):
         self.width = width
         self.height = height
-        self.lines: List[str] = ['']
-        self.scrollback: List[str] = []  # Keep scrollback buffer
+        # Each visible row is a mutable list of single characters, so a
+        # write is one cell assignment instead of a list()/''.join()
+        # rebuild of the whole line; rows are joined to str only when a
+        # line scrolls off or the screen is read
+        self.lines: List[List[str]] = [[]]
+        self.scrollback_size = 10000  # Keep last 10000 lines
+        # deque with maxlen enforces the scrollback cap in O(1) per line
+        # instead of re-slicing the whole buffer on overflow
+        self.scrollback = deque(maxlen=self.scrollback_size)
         self.current_line = 0
         self.cursor_x = 0
-        self.scrollback_size = 10000  # Keep last 10000 lines
+        # Escape sequences are consumed by process_text and stray control
+        # characters are dropped in _write_char, so get_output() never needs
+        # another strip_ansi pass
+        self.output_is_clean = True
+        # Monotonic state version, bumped whenever the buffer may change;
+        # lets callers cache derived views of the screen and invalidate
+        # them only when the terminal has actually moved on
+        self._seq = 0
         
     def process_text(self, text: str) -> str:
         """
         Process text output and update terminal state.
         Returns the visible text that was written.
         """
+        self._seq += 1
         i = 0
-        
-        while i < len(text):
+        # Hoisted once per call: the loop body otherwise pays an attribute
+        # or global lookup for each of these on every iteration. The data
+        # attributes themselves stay on self because _write_run and the
+        # CSI branches mutate them mid-loop.
+        text_len = len(text)
+        plain_match = _PLAIN_RUN_RE.match
+        write_run = self._write_run
+        write_char = self._write_char
+
+        while i < text_len:
+            # Fast path: write whole runs of plain printable text at once;
+            # only escapes, control characters and non-ASCII fall through
+            # to the per-character branches
+            match = plain_match(text, i)
+            if match is not None:
+                write_run(match.group())
+                i = match.end()
+                continue
+
             char = text[i]
-            
+
             # Handle escape sequences
             if char == '\x1b':
                 i += 1
-                if i >= len(text):
+                if i >= text_len:
                     break
                     
                 if text[i] == '[':
                     # ANSI CSI sequence
                     i += 1
-                    params = []
-                    param_str = ''
-                    
-                    # Parse parameters
-                    while i < len(text) and text[i] not in 'ABCDEFGHJKSTfmsu':
-                        if text[i] == ';':
-                            if param_str:
-                                params.append(param_str)
-                            param_str = ''
-                        else:
-                            param_str += text[i]
-                        i += 1
-                    
-                    if param_str:
-                        params.append(param_str)
-                    
-                    if i < len(text):
-                        cmd = text[i]
-                        i += 1
-                        
+
+                    # Fast path: one anchored match covers the common
+                    # well-formed sequence. Anything else falls back to the
+                    # terminator scan, which keeps the original skip-past-
+                    # unknown-bytes semantics.
+                    match = _CSI_PARAM_RE.match(text, i)
+                    if match is not None:
+                        params = [p for p in match.group(1).split(';') if p]
+                        cmd = match.group(2)
+                        i = match.end()
+                    else:
+                        match = _CSI_END_RE.search(text, i)
+                        if match is not None:
+                            params = [p for p in text[i:match.start()].split(';') if p]
+                            cmd = match.group()
+                            i = match.end()
+                    if match is None:
+                        # Unterminated sequence - consume the rest, no dispatch
+                        i = text_len
+                    else:
                         # Handle cursor movement commands
                         if cmd == 'A':  # Cursor up
                             try:
@@ -93,7 +144,7 @@ class Terminal:
                         elif cmd == 'J':  # Erase display
                             if params and params[0] == '2':
                                 # Clear entire screen
-                                self.lines = ['']
+                                self.lines = [[]]
                                 self.current_line = 0
                                 self.cursor_x = 0
                             else:
@@ -102,14 +153,12 @@ class Terminal:
                                 # Clear remaining lines
                                 while self.current_line < len(self.lines) - 1:
                                     self.current_line += 1
-                                    self.lines[self.current_line] = ''
+                                    self.lines[self.current_line] = []
                 elif text[i] == ']':
-                    # OSC sequence - skip until BEL
-                    i += 1
-                    while i < len(text) and text[i] != '\x07':
-                        i += 1
-                    if i < len(text):
-                        i += 1
+                    # OSC sequence - skip until BEL (memchr instead of a
+                    # per-char loop)
+                    end = text.find('\x07', i + 1)
+                    i = text_len if end < 0 else end + 1
                 else:
                     # Other escape sequence
                     i += 1
@@ -124,16 +173,13 @@ class Terminal:
                 # Newline
                 # Save current line to scrollback if we're about to scroll off
                 if self.current_line >= self.height - 1:
-                    # Move top line to scrollback
+                    # Move top line to scrollback; the deque drops its
+                    # oldest entry automatically once the cap is reached
                     if self.lines:
-                        self.scrollback.append(self.lines[0])
-                        self.lines = self.lines[1:]
-                        # Trim scrollback if too large
-                        if len(self.scrollback) > self.scrollback_size:
-                            self.scrollback = self.scrollback[-self.scrollback_size:]
+                        self.scrollback.append(''.join(self.lines.pop(0)))
                 else:
                     if self.current_line >= len(self.lines) - 1:
-                        self.lines.append('')
+                        self.lines.append([])
                     self.current_line += 1
                 self.cursor_x = 0
                 i += 1
@@ -143,36 +189,36 @@ class Terminal:
                     self.cursor_x -= 1
                 i += 1
             elif char == '\t':
-                # Tab - convert to spaces
+                # Tab - convert to spaces, written as one blitted run
                 spaces = 8 - (self.cursor_x % 8)
-                for _ in range(spaces):
-                    self._write_char(' ')
+                write_run(' ' * spaces)
                 i += 1
             else:
                 # Regular character
-                self._write_char(char)
+                write_char(char)
                 i += 1
         
         return ''  # We don't need to return visible text here
     
     def _write_char(self, char: str):
         """Write a character at the current cursor position."""
+        # Drop control characters that aren't handled above so the buffer
+        # stays free of anything strip_ansi would remove
+        code = ord(char)
+        if code < 0x20 or code == 0x7f:
+            return
+        
         # Ensure we have enough lines
         while self.current_line >= len(self.lines):
-            self.lines.append('')
-        
-        # Extend line if needed
-        line = list(self.lines[self.current_line])
-        while len(line) <= self.cursor_x:
-            line.append(' ')
+            self.lines.append([])
         
-        # Write character (overwrite if position exists)
-        if self.cursor_x < len(line):
-            line[self.cursor_x] = char
-        else:
-            line.append(char)
+        # Extend line with spaces up to the cursor if needed
+        row = self.lines[self.current_line]
+        while len(row) <= self.cursor_x:
+            row.append(' ')
         
-        self.lines[self.current_line] = ''.join(line)
+        # Write character (overwrite in place)
+        row[self.cursor_x] = char
         self.cursor_x += 1
         
         # Auto-wrap if needed
@@ -181,29 +227,125 @@ class Terminal:
             if self.current_line < len(self.lines) - 1:
                 self.current_line += 1
             else:
-                self.lines.append('')
+                self.lines.append([])
                 self.current_line = len(self.lines) - 1
     
+    def _write_run(self, run: str):
+        """Write a run of printable characters, wrapping as needed."""
+        pos = 0
+        while pos < len(run):
+            remaining = self.width - self.cursor_x
+            if remaining <= 0:
+                # Cursor pushed past the right edge (e.g. by a CSI C move);
+                # the per-char path handles the write-then-wrap there
+                self._write_char(run[pos])
+                pos += 1
+                continue
+            chunk = run[pos:pos + remaining]
+
+            # Ensure we have enough lines
+            while self.current_line >= len(self.lines):
+                self.lines.append([])
+
+            # Extend line with spaces up to the cursor if needed
+            row = self.lines[self.current_line]
+            while len(row) < self.cursor_x:
+                row.append(' ')
+
+            # Blit the chunk over existing cells in one slice assignment
+            row[self.cursor_x:self.cursor_x + len(chunk)] = chunk
+            self.cursor_x += len(chunk)
+            pos += len(chunk)
+
+            # Auto-wrap if needed
+            if self.cursor_x >= self.width:
+                self.cursor_x = 0
+                if self.current_line < len(self.lines) - 1:
+                    self.current_line += 1
+                else:
+                    self.lines.append([])
+                    self.current_line = len(self.lines) - 1
+
     def _clear_to_eol(self):
         """Clear from cursor to end of line."""
         if self.current_line < len(self.lines):
-            line = list(self.lines[self.current_line])
+            row = self.lines[self.current_line]
             # Truncate at cursor position
-            if self.cursor_x < len(line):
-                self.lines[self.current_line] = ''.join(line[:self.cursor_x])
+            if self.cursor_x < len(row):
+                del row[self.cursor_x:]
     
-    def get_output(self) -> str:
-        """Get the current terminal output as a string."""
+    def get_output_lines(self) -> List[str]:
+        """Get the current terminal output as a list of lines.
+
+        Callers that work line by line should prefer this over
+        get_output(): it hands back the scrollback strings as-is and only
+        joins the visible rows, skipping the full-buffer join that the
+        caller would immediately split again.
+        """
         # Combine scrollback and current lines
-        all_lines = self.scrollback + self.lines
+        all_lines = list(self.scrollback) + [''.join(row) for row in self.lines]
         # Remove trailing empty lines
         while all_lines and not all_lines[-1].strip():
             all_lines.pop()
-        return '\n'.join(all_lines)
+        return all_lines
+
+    def get_output(self) -> str:
+        """Get the current terminal output as a string."""
+        return '\n'.join(self.get_output_lines())
     
     def reset(self):
         """Reset terminal state."""
-        self.lines = ['']
+        self._seq += 1
+        self.lines = [[]]
         self.current_line = 0
         self.cursor_x = 0
 
+
+def replay_with_snapshots(terminal: Terminal,
+                          events: List[Tuple[float, str, str]],
+                          prompt_hits: Optional[List[bool]] = None
+                          ) -> Tuple[List[Tuple[int, str, float]], int]:
+    """
+    Replay events through a terminal, snapshotting at command boundaries.
+
+    HybridExtractor and ImprovedExtractor used to carry identical replay
+    loops, so running both on one cast replayed the whole event stream
+    twice. This shared pass feeds every 'o' event to the terminal and
+    captures the screen just before each new prompt and right after each
+    Enter, plus a final snapshot, so one replay serves every consumer of
+    the snapshot list.
+
+    Args:
+        terminal: Terminal instance to replay into (mutated in place)
+        events: Event list as returned by parse_cast_file
+        prompt_hits: Optional per-event prompt flags from
+            parser.precompute_prompt_hits
+
+    Returns:
+        Tuple of (snapshots, last_prompt_idx); snapshots are
+        (event_index, screen_text, timestamp) and last_prompt_idx is the
+        index of the last prompt-bearing event, or -1
+    """
+    snapshots = []
+    last_prompt_idx = -1
+
+    for i, (timestamp, event_type, text) in enumerate(events):
+        if event_type != 'o':
+            continue
+
+        if prompt_hits[i] if prompt_hits is not None else prompt_hit(text):
+            # Snapshot the screen as it was before this prompt redraws it
+            if i > 0:
+                snapshots.append((i, terminal.get_output(), timestamp))
+            last_prompt_idx = i
+
+        terminal.process_text(text)
+
+        if contains_enter(text):
+            # Snapshot right after Enter to capture the finished command
+            snapshots.append((i, terminal.get_output(), timestamp))
+
+    # Final snapshot
+    snapshots.append((len(events), terminal.get_output(),
+                      events[-1][0] if events else 0.0))
+    return snapshots, last_prompt_idx